@@ -1,27 +1,147 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import asyncio
+from functools import partial
+from typing import Callable, List
 
-from app.api.schemas import InsuranceRequestSchema
-from app.crud.tariffs import (get_tariff, get_tariff_date_lte_date,
-                              get_tariff_other_or_error)
-from app.utils.handle_tariff_exceptions import handle_tariff_exceptions
-from database.session import get_db
+import ijson
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.api.schemas import InsuranceBatchResultSchema, InsuranceRequestSchema
+from app.config import (CALCULATE_BATCH_MAX_SIZE, CALCULATE_BATCHER_ENABLED,
+                        REPRICING_CHUNK_SIZE, TARIFF_CACHE_ENABLED,
+                        TARIFF_SNAPSHOT_ENABLED)
+from app.crud.rate_batcher import rate_batcher
+from app.crud.tariff_cache import tariff_cache
+from app.crud.tariff_lookup import lookup_rate_for_calculate
+from app.crud.tariff_version import tariff_book_version
+from app.crud.tariffs import get_rates_for_dates
+from app.repricing.engine import (RepricingReport, ShipmentFileError,
+                                  iter_shipment_chunks, read_candidate_book,
+                                  reprice_chunk)
+from app.snapshot.publisher import build_snapshot, snapshot_publisher
+from app.snapshot.snapshot import snapshot_reader
+from app.utils.handle_tariff_exceptions import (TARIFF_EXCEPTIONS,
+                                                handle_tariff_exceptions)
+from app.utils.pricing import calculate_prices
+from app.utils.tariff_file import iter_tariff_file
+from database.session import get_read_conn_factory, get_read_db
 
 insurance_routers = APIRouter()
 
 
 @insurance_routers.post("/calculate", response_model=float)
 @handle_tariff_exceptions
-def calculate_insurance(
+async def calculate_insurance(
     request: InsuranceRequestSchema, 
-    db: Session = Depends(get_db)
+    conn_factory: Callable[[], AsyncConnection] = Depends(get_read_conn_factory)
 ):
-    tariff_date = get_tariff_date_lte_date(db, request.date)
-    tariff = get_tariff(db, tariff_date.id, request.cargo_type)
-    
-    if not tariff:
-        tariff = get_tariff_other_or_error(db, tariff_date.id)
+    snapshot = snapshot_reader.current() if TARIFF_SNAPSHOT_ENABLED else None
+
+    # снимок старше своих изменений воркера не используется, пока не переопубликуется
+    if snapshot is not None and snapshot.version >= tariff_book_version.known:
+        rate = snapshot.get_rate(request.date, request.cargo_type)
+    elif TARIFF_CACHE_ENABLED:
+        # пока книга перечитывается, промахи кэша идут пакетами через batcher
+        miss_lookup = partial(rate_batcher.get_rate, conn_factory) if CALCULATE_BATCHER_ENABLED else None
+        rate = await tariff_cache.get_rate(conn_factory, request.date, request.cargo_type, miss_lookup)
+    elif CALCULATE_BATCHER_ENABLED:
+        # соединение берет пакет, а не каждый запрос
+        rate = await rate_batcher.get_rate(conn_factory, request.date, request.cargo_type)
+    else:
+        async with conn_factory() as conn:
+            rate = await lookup_rate_for_calculate(conn, request.date, request.cargo_type)
 
-    calculated_price = request.cost * tariff.rate
+    calculated_price = request.cost * rate
     
     return calculated_price
+
+
+@insurance_routers.post("/calculate_batch", response_model=List[InsuranceBatchResultSchema])
+async def calculate_insurance_batch(
+    requests: List[InsuranceRequestSchema],
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Расчет стоимости страхования для списка грузов.
+    Ошибка в одной позиции не прерывает расчет остальных.
+    """
+    if not requests:
+        raise HTTPException(status_code=400, detail="Вы передали пустой список")
+
+    if len(requests) > CALCULATE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Максимальный размер пакета: {CALCULATE_BATCH_MAX_SIZE}"
+        )
+
+    dates = [request.date for request in requests]
+    cargo_types = [request.cargo_type for request in requests]
+    costs = [request.cost for request in requests]
+
+    rates = await get_rates_for_dates(db, zip(dates, cargo_types))
+    prices, errors = calculate_prices(dates, cargo_types, costs, rates)
+
+    results = []
+    for price, error in zip(prices.tolist(), errors):
+        if error:
+            status_code, detail = TARIFF_EXCEPTIONS[error]
+            results.append(InsuranceBatchResultSchema(status_code=status_code, detail=detail))
+        else:
+            results.append(InsuranceBatchResultSchema(price=price))
+
+    return results
+
+
+@insurance_routers.post("/what_if", response_model=dict)
+async def what_if_repricing(
+    tariffs: UploadFile = File(..., description="Кандидатная книга в формате /tariffs/upload (JSON)"),
+    shipments: UploadFile = File(..., description="CSV отгрузок: date,cargo_type,cost"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Премии по отгрузкам на кандидатной и текущей тарифных книгах
+    с разницей по cargo_type и датам. Ставки подбираются как в /calculate.
+    Файл отгрузок читается потоково и считается пакетами.
+    """
+    try:
+        candidate = await read_candidate_book(iter_tariff_file(tariffs))
+    except (ValueError, TypeError, KeyError, AttributeError, ijson.JSONError):
+        raise HTTPException(status_code=400, detail="Некорректный файл тарифов.")
+
+    report = RepricingReport(candidate, await build_snapshot(db))
+
+    try:
+        async for chunk in iter_shipment_chunks(shipments, REPRICING_CHUNK_SIZE):
+            await asyncio.to_thread(reprice_chunk, report, chunk)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Ошибка при декодировании файла. Файл не является текстовым.")
+    except ShipmentFileError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный файл отгрузок. {e}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный файл отгрузок.")
+
+    return report.result()
+
+
+@insurance_routers.get("/cache_stats", response_model=dict)
+async def get_cache_stats():
+    """
+    Счетчики попаданий/промахов кэша тарифов
+    """
+    return tariff_cache.stats()
+
+
+@insurance_routers.get("/batcher_stats", response_model=dict)
+async def get_batcher_stats():
+    """
+    Статистика склейки запросов /calculate: пакеты, запросы и разные ключи.
+    """
+    return rate_batcher.stats()
+
+
+@insurance_routers.get("/snapshot_stats", response_model=dict)
+async def get_snapshot_stats():
+    """
+    Состояние общего снимка тарифной книги
+    """
+    return {**snapshot_reader.stats(), **snapshot_publisher.stats()}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+metrics_routers = APIRouter()
+
+
+@metrics_routers.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Метрики в текстовом формате Prometheus
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -35,6 +35,21 @@ class InsuranceRequestSchema(TariffRequestSchema):
     cost: float
 
 
+class InsuranceBatchResultSchema(BaseModel):
+    price: Optional[float] = None
+    status_code: int = 200
+    detail: Optional[str] = None
+
+
+class TariffBatchResultSchema(TariffRequestSchema):
+    status_code: int = 200
+    detail: Optional[str] = None
+
+
 class StatusResponse(BaseModel):
     status: str
     message: str
+
+
+class ImportResponse(StatusResponse):
+    rows: int
@@ -1,39 +1,63 @@
-import json
-import logging
-from datetime import datetime, timezone, tzinfo
-from typing import List
+from datetime import date
+from typing import Callable, List, Optional
 
-from fastapi import (APIRouter, Depends, File, HTTPException, Query,
-                     UploadFile, status)
-from kafka import KafkaProducer
-from sqlalchemy.orm import Session
+import ijson
+from fastapi import (APIRouter, Depends, File, Header, HTTPException, Query,
+                     Response, UploadFile, status)
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from starlette.background import BackgroundTask
 
-from app.api.schemas import (StatusResponse, TariffDateSchema,
+from app.api.schemas import (ImportResponse, StatusResponse,
+                             TariffBatchResultSchema, TariffDateSchema,
                              TariffRequestSchema, TariffRequestUpdateSchema)
-from app.config import KAFKA_HOST, KAFKA_PORT
-from app.crud.tariffs import (create_tariffs, get_tariff_date_or_error,
-                              remove_tariff, update_tariff_in_db)
-from app.utils.handle_tariff_exceptions import handle_tariff_exceptions
-from database.models import TariffDate
-from database.session import get_db
+from app.audit.log import audit_log
+from app.config import (EXPORT_BATCH_SIZE, IMPORT_MAX_ERRORS,
+                        TARIFF_BATCH_MAX_SIZE, TARIFF_CHANGES_MAX_WAIT,
+                        TARIFF_LIST_CACHE_SIZE,
+                        TARIFF_PARTITION_RETENTION_YEARS, UPLOAD_CHUNK_SIZE)
+from app.crud.tariff_changes import (latest_change_version,
+                                     stream_tariff_changes, tariff_change_feed)
+from app.crud.tariffs import (create_tariffs, create_tariffs_in_chunks,
+                              get_tariff_date_or_error, get_tariff_dates_page,
+                              import_tariff_records, remove_tariff,
+                              remove_tariffs_batch, stream_tariff_rows,
+                              update_tariff_in_db, update_tariffs_batch)
+from app.crud.tariff_partitions import (archive_old_tariffs,
+                                        ensure_tariff_partitions,
+                                        get_tariff_partitions,
+                                        tariff_partition_maintainer)
+from app.crud.tariff_validity import (find_validity_mismatches,
+                                      refresh_tariff_validity)
+from app.crud.tariff_version import (read_tariff_book_version,
+                                     tariff_book_version)
+from app.outbox.relay import outbox_relay
+from app.utils.cursor import InvalidCursor, decode_cursor, encode_cursor
+from app.utils.etag import etag_matches, make_etag
+from app.utils.handle_tariff_exceptions import (TARIFF_EXCEPTIONS,
+                                                handle_tariff_exceptions)
+from app.utils.lru import LRUCache
+from app.utils.tariff_csv import TariffCsvErrors, iter_tariff_csv
+from app.utils.tariff_export import (EXPORT_FORMATS, accepts_gzip,
+                                     encode_changes_ndjson, encode_export,
+                                     encode_stream)
+from app.utils.tariff_file import iter_tariff_file, validate_tariff_file
+from database.session import (get_read_conn_factory, get_read_db,
+                              get_write_db)
 
-producer = KafkaProducer(
-    bootstrap_servers=f"{KAFKA_HOST}:{KAFKA_PORT}",
-    value_serializer=lambda v: json.dumps(v).encode("utf-8"),
-    batch_size=16384,
-    linger_ms=5
-)
-
-logger = logging.getLogger(__name__)
+tariff_routers = APIRouter()
 
+tariff_dates_adapter = TypeAdapter(List[TariffDateSchema])
 
-tariff_routers = APIRouter()
+# (версия, page, size, sort_desc, cursor) -> (тело ответа, курсор следующей страницы)
+list_pages_cache = LRUCache(TARIFF_LIST_CACHE_SIZE)
 
 
 @tariff_routers.post("/upload", status_code=status.HTTP_201_CREATED, response_model=StatusResponse)
-def upload_tariffs(
+async def upload_tariffs(
     tariffs: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """
     Принимаем тарифы словарем
@@ -42,107 +66,400 @@ def upload_tariffs(
         raise HTTPException(status_code=400, detail="Вы передали пустой словарь")
     
     try: 
-        create_tariffs(db, tariffs)
+        await create_tariffs(db, tariffs)
     except Exception:
         raise HTTPException(status_code=500, detail=f"Ошибка при загрузки тарифа")
 
+    audit_log.log("upload_tariffs", {"dates": len(tariffs)})
+
     return StatusResponse(status="success", message="Тарифы успешно загружены.")
 
 
 @tariff_routers.post("/upload_with_file", status_code=status.HTTP_201_CREATED, response_model=StatusResponse)
-def upload_tariffs_with_file(
+async def upload_tariffs_with_file(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
     """
     Загружает тарифы из JSON файла.
+    Файл разбирается потоково и пишется в БД пакетами.
     """
-    if file:
-        if file.content_type != "application/json":
-            raise HTTPException(status_code=400, detail="Файл должен быть формата JSON.")
+    if file.content_type != "application/json":
+        raise HTTPException(status_code=400, detail="Файл должен быть формата JSON.")
+
+    try:
+        await validate_tariff_file(file)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Ошибка при декодировании файла. Файл не является текстовым.")
+    except ijson.JSONError:
+        raise HTTPException(status_code=400, detail="Ошибка при парсинге JSON из файла.")
 
-        contents = file.file.read()
-        try:
-            contents_str = contents.decode()
-            try:
-                tariffs = json.loads(contents_str)
-            except json.JSONDecodeError:
-                raise HTTPException(status_code=400, detail="Ошибка при парсинге JSON из файла.")
-        except UnicodeDecodeError:
-            raise HTTPException(status_code=400, detail="Ошибка при декодировании файла. Файл не является текстовым.")
-    
     try: 
-        create_tariffs(db, tariffs)
+        loaded = await create_tariffs_in_chunks(db, iter_tariff_file(file), UPLOAD_CHUNK_SIZE)
     except Exception:
         raise HTTPException(status_code=500, detail=f"Ошибка при загрузки тарифа")
 
+    audit_log.log("upload_tariffs_with_file", {"filename": file.filename, "tariffs": loaded})
+
     return StatusResponse(status="success", message="Тарифы успешно загружены.")
 
 
+CSV_CONTENT_TYPES = ("text/csv", "application/csv", "application/vnd.ms-excel")
+
+
+@tariff_routers.post("/import_csv", status_code=status.HTTP_201_CREATED, response_model=ImportResponse)
+async def import_tariffs_csv(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Загружает тарифы из CSV со строками date,cargo_type,rate.
+    Файл читается потоково и через COPY попадает во временную таблицу,
+    откуда тарифы сливаются одним запросом. При ошибках в строках
+    ничего не загружается, а в ответе перечисляются ошибочные строки.
+    """
+    if file.content_type not in CSV_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Файл должен быть формата CSV.")
+
+    errors = TariffCsvErrors(IMPORT_MAX_ERRORS)
+
+    try:
+        rows = await import_tariff_records(db, iter_tariff_csv(file, errors), errors)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Ошибка при декодировании файла. Файл не является текстовым.")
+    except Exception:
+        raise HTTPException(status_code=500, detail="Ошибка при загрузке тарифов")
+
+    if errors:
+        raise HTTPException(status_code=400, detail={
+            "message": "Файл содержит некорректные строки, тарифы не загружены.",
+            "error_count": errors.count,
+            "errors": errors.items,
+        })
+
+    if not rows:
+        raise HTTPException(status_code=400, detail="Файл не содержит тарифов.")
+
+    audit_log.log("import_tariffs_csv", {"file_name": file.filename, "rows": rows})
+
+    return ImportResponse(status="success", message="Тарифы успешно загружены.", rows=rows)
+
+
 @tariff_routers.get("/list", response_model=List[TariffDateSchema])
-def get_list_tariffs(
-    db: Session = Depends(get_db),
+async def get_list_tariffs(
+    db: AsyncSession = Depends(get_read_db),
     page: int=Query(1, ge=1, description="Номер страницы."),
-    size: int=Query(10, le=100, description="Количество записей на странице"),
-    sort_desc: bool=Query(False, description="Сортировка в обратном порядке")
+    size: int=Query(10, ge=1, le=100, description="Количество записей на странице"),
+    sort_desc: bool=Query(False, description="Сортировка в обратном порядке"),
+    cursor: Optional[str]=Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    if_none_match: Optional[str]=Header(None)
 ):
-    query = db.query(TariffDate)
+    """
+    Список тарифов по датам.
+    Для глубоких страниц используйте cursor вместо page: курсор следующей
+    страницы возвращается в заголовке X-Next-Cursor.
+    Ответ содержит ETag; при совпадении If-None-Match возвращается 304.
+    """
+    after = None
+    offset = (page - 1) * size
 
-    if not sort_desc:
-        query = query.order_by(TariffDate.date.asc())
-    else:
-        query = query.order_by(TariffDate.date.desc())
+    if cursor:
+        try:
+            after, cursor_desc = decode_cursor(cursor)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Некорректный курсор.")
 
-    offset = (page - 1) * size
-    tariff_dates = query.offset(offset).limit(size).all()
+        if cursor_desc != sort_desc:
+            raise HTTPException(status_code=400, detail="Курсор получен для другого порядка сортировки.")
 
-    return tariff_dates
+        offset = 0
 
+    page_key = (page if not cursor else None, size, sort_desc, cursor)
+    version = await tariff_book_version.get(db)
+    etag = make_etag(version, page_key)
 
-@tariff_routers.delete("/", response_model=StatusResponse)
-@handle_tariff_exceptions
-def delete_tariff(request: TariffRequestSchema, db: Session = Depends(get_db)):
-    tariff_date = get_tariff_date_or_error(db, request.date)
-    remove_tariff(db, tariff_date, request.cargo_type)
-
-    log_data = {
-        "action": "delete_tariff",
-        "details": {
-            "tariff_date": request.date.isoformat(),
-            "cargo_type": request.cargo_type
-        },
-        "time": datetime.now(timezone.utc).isoformat()
-    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
 
+    cached = list_pages_cache.get((version, page_key))
+
+    if cached is None:
+        # версия читается в той же транзакции до страницы: реплика могла
+        # еще не получить изменение, о котором процесс уже знает, и такая
+        # страница не должна попасть в кэш и ETag под известной версией
+        page_version = await read_tariff_book_version(db)
+        tariff_dates = await get_tariff_dates_page(db, size + 1, sort_desc, after, offset)
+        next_cursor = None
+
+        if len(tariff_dates) > size:
+            tariff_dates = tariff_dates[:size]
+            next_cursor = encode_cursor(tariff_dates[-1].date, sort_desc)
+
+        body = tariff_dates_adapter.dump_json(
+            tariff_dates_adapter.validate_python(tariff_dates, from_attributes=True)
+        )
+        cached = (body, next_cursor)
+        etag = make_etag(page_version, page_key)
+
+        if page_version >= version:
+            list_pages_cache.put((page_version, page_key), cached)
+
+    body, next_cursor = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@tariff_routers.get("/export", response_class=StreamingResponse)
+async def export_tariffs(
+    connect: Callable[[], AsyncConnection] = Depends(get_read_conn_factory),
+    export_format: str=Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="ndjson или csv"),
+    date_from: Optional[date]=Query(None, description="Даты тарифов начиная с"),
+    date_to: Optional[date]=Query(None, description="Даты тарифов по (включительно)"),
+    cargo_type: Optional[List[str]]=Query(None, description="Только указанные cargo_type"),
+    accept_encoding: Optional[str]=Header(None)
+):
+    """
+    Выгрузка всей тарифной книги построчно (NDJSON или CSV).
+    Строки читаются серверным курсором и отдаются по мере чтения,
+    при Accept-Encoding: gzip поток сжимается на лету.
+    """
+    compress = accepts_gzip(accept_encoding)
+
+    async def batches():
+        async with connect() as conn:
+            async for rows in stream_tariff_rows(conn, EXPORT_BATCH_SIZE, date_from, date_to, cargo_type):
+                yield rows
+
+    headers = {"Content-Disposition": f'attachment; filename="tariffs.{export_format}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        encode_export(batches(), export_format, compress),
+        media_type=EXPORT_FORMATS[export_format],
+        headers=headers,
+    )
+
+
+@tariff_routers.get("/changes")
+async def get_tariff_changes(
+    connect: Callable[[], AsyncConnection] = Depends(get_read_conn_factory),
+    since: int=Query(0, ge=0, description="Последняя полученная версия"),
+    wait: float=Query(0, ge=0, le=TARIFF_CHANGES_MAX_WAIT, description="Сколько секунд ждать новых изменений"),
+    accept_encoding: Optional[str]=Header(None)
+):
+    """
+    Изменения тарифов после версии since построчно в NDJSON
+    (version, op: upsert/delete, date, cargo_type, rate) в порядке применения.
+    Следующий запрос - с since, равным version последней строки.
+    Если изменений нет, ответ 204 сразу или после ожидания до wait секунд.
+    """
+    if wait:
+        await tariff_change_feed.wait(connect, since, wait)
+
+    # версия и строки читаются с одной реплики: иначе отстающая реплика
+    # могла бы отдать пустой поток при ответе 200
+    conn = await connect().start()
     try:
-        producer.send("tariff_changes", log_data)
-        logger.info(f"Tariff update log sent to Kafka: {log_data}")
-    except Exception as e:
-        logger.error(f"Failed to send log to Kafka: {e}")
+        latest = await latest_change_version(conn)
+    except BaseException:
+        await conn.close()
+        raise
+
+    if latest <= since:
+        await conn.close()
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    compress = accepts_gzip(accept_encoding)
+
+    async def batches():
+        try:
+            async for rows in stream_tariff_changes(conn, since, EXPORT_BATCH_SIZE):
+                yield rows
+        finally:
+            await conn.close()
+
+    return StreamingResponse(
+        encode_stream(batches(), encode_changes_ndjson, compress),
+        media_type=EXPORT_FORMATS["ndjson"],
+        headers={"Content-Encoding": "gzip"} if compress else None,
+        # соединение закрывается и если клиент ушел до начала тела
+        background=BackgroundTask(conn.close),
+    )
+
+
+@tariff_routers.get("/changes_stats", response_model=dict)
+async def get_changes_stats():
+    """
+    Количество ожидающих long-poll запросов /changes
+    """
+    return tariff_change_feed.stats()
+
+
+@tariff_routers.delete("/", response_model=StatusResponse)
+@handle_tariff_exceptions
+async def delete_tariff(request: TariffRequestSchema, db: AsyncSession = Depends(get_write_db)):
+    tariff_date = await get_tariff_date_or_error(db, request.date)
+    await remove_tariff(db, tariff_date, request.cargo_type)
 
     return StatusResponse(status="success", message="Тариф успешно удален.")
 
 
 @tariff_routers.patch("/", response_model=StatusResponse)
 @handle_tariff_exceptions
-def update_tariff(request: TariffRequestUpdateSchema, db: Session = Depends(get_db)):
-    tariff_date = get_tariff_date_or_error(db, request.date)
-    update_tariff_in_db(db, tariff_date, request.cargo_type, request.rate)
-    
-    log_data = {
-        "action": "update_tariff",
-        "details": {
-            "tariff_date": request.date.isoformat(),
-            "cargo_type": request.cargo_type,
-            "rate": str(request.rate)
-        },
-        "time": datetime.now(timezone.utc).isoformat()
+async def update_tariff(request: TariffRequestUpdateSchema, db: AsyncSession = Depends(get_write_db)):
+    tariff_date = await get_tariff_date_or_error(db, request.date)
+    await update_tariff_in_db(db, tariff_date, request.cargo_type, request.rate)
+
+    return StatusResponse(status="success", message="Тариф успешно обновлен.")
+
+
+def check_batch_size(requests: list):
+    if not requests:
+        raise HTTPException(status_code=400, detail="Вы передали пустой список")
+
+    if len(requests) > TARIFF_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Максимальный размер пакета: {TARIFF_BATCH_MAX_SIZE}"
+        )
+
+
+def batch_results(requests: list, errors: dict) -> List[TariffBatchResultSchema]:
+    results = []
+    for request in requests:
+        error = errors[request.date, request.cargo_type]
+        result = TariffBatchResultSchema(date=request.date, cargo_type=request.cargo_type)
+
+        if error:
+            result.status_code, result.detail = TARIFF_EXCEPTIONS[error]
+
+        results.append(result)
+
+    return results
+
+
+@tariff_routers.patch("/batch", response_model=List[TariffBatchResultSchema])
+async def update_tariffs(
+    requests: List[TariffRequestUpdateSchema],
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Обновление списка тарифов в одной транзакции.
+    Ненайденный тариф не прерывает обновление остальных.
+    """
+    check_batch_size(requests)
+
+    errors = await update_tariffs_batch(
+        db, [(request.date, request.cargo_type, request.rate) for request in requests]
+    )
+
+    return batch_results(requests, errors)
+
+
+@tariff_routers.delete("/batch", response_model=List[TariffBatchResultSchema])
+async def delete_tariffs(
+    requests: List[TariffRequestSchema],
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Удаление списка тарифов в одной транзакции.
+    Ненайденный тариф не прерывает удаление остальных.
+    """
+    check_batch_size(requests)
+
+    errors = await remove_tariffs_batch(db, [(request.date, request.cargo_type) for request in requests])
+
+    return batch_results(requests, errors)
+
+
+@tariff_routers.get("/outbox_stats", response_model=dict)
+async def get_outbox_stats():
+    """
+    Метрики доставки событий изменения тарифов
+    """
+    return outbox_relay.stats()
+
+
+@tariff_routers.get("/audit_stats", response_model=dict)
+async def get_audit_stats():
+    """
+    Состояние очереди аудита
+    """
+    return audit_log.stats()
+
+
+@tariff_routers.get("/validity_check", response_model=dict)
+async def check_tariff_validity(db: AsyncSession = Depends(get_write_db)):
+    """
+    Проверка интервалов действия: valid_to каждой даты
+    должен совпадать со следующей датой тарифов
+    """
+    mismatches = await find_validity_mismatches(db)
+
+    return {"consistent": not mismatches, "mismatches": mismatches}
+
+
+@tariff_routers.post("/validity_repair", response_model=dict)
+async def repair_tariff_validity(db: AsyncSession = Depends(get_write_db)):
+    """
+    Пересчитывает интервалы действия всех дат
+    """
+    repaired = await refresh_tariff_validity(db)
+    await db.commit()
+
+    return {"repaired": repaired}
+
+
+@tariff_routers.get("/partitions", response_model=dict)
+async def list_tariff_partitions(db: AsyncSession = Depends(get_read_db)):
+    """
+    Годовые секции таблицы тарифов и счетчики их обслуживания
+    """
+    return {
+        "partitions": await get_tariff_partitions(db),
+        **tariff_partition_maintainer.stats(),
     }
 
-    try:
-        producer.send("tariff_changes", log_data)
-        logger.info(f"Tariff update log sent to Kafka: {log_data}")
-    except Exception as e:
-        logger.error(f"Failed to send log to Kafka: {e}")
 
-    return StatusResponse(status="success", message="Тариф успешно обновлен.")
+@tariff_routers.post("/partitions/ensure", response_model=dict)
+async def create_tariff_partitions(db: AsyncSession = Depends(get_write_db)):
+    """
+    Создает недостающие секции, не дожидаясь фонового обслуживания
+    """
+    created = await ensure_tariff_partitions(db)
+    await db.commit()
+
+    return {"created": created}
+
+
+@tariff_routers.post("/partitions/archive", response_model=dict)
+async def archive_tariff_years(
+    before_year: int=Query(..., ge=1900, le=9999, description="Архивировать годы раньше указанного"),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """
+    Отсоединяет секции старых лет в схему архива и удаляет их даты из книги.
+    Годы в пределах TARIFF_PARTITION_RETENTION_YEARS (и текущий) не архивируются.
+    """
+    latest_allowed = date.today().year - TARIFF_PARTITION_RETENTION_YEARS
+
+    if before_year > latest_allowed:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Можно архивировать только годы раньше {latest_allowed}: более поздние входят в срок хранения.",
+        )
+
+    return {"archived": await archive_old_tariffs(db, before_year)}
+
+
+@tariff_routers.get("/list_cache_stats", response_model=dict)
+async def get_list_cache_stats():
+    """
+    Состояние кэша страниц списка тарифов
+    """
+    return list_pages_cache.stats()
@@ -0,0 +1,133 @@
+import logging
+import queue
+from datetime import datetime, timezone
+from threading import Lock, Thread
+from typing import List, Optional, Tuple
+
+from app.audit.sinks import AuditSink
+from app.config import (AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL,
+                        AUDIT_OVERFLOW_POLICY, AUDIT_QUEUE_SIZE)
+
+logger = logging.getLogger(__name__)
+
+AUDIT_TOPIC = "tariff_audit"
+
+DROP_NEW = "drop_new"
+DROP_OLDEST = "drop_oldest"
+
+
+class AuditLog:
+    """
+    Буфер аудита между обработчиками запросов и AuditSink.
+
+    Обработчики только кладут событие в ограниченную очередь и никогда
+    не ждут брокер. Фоновый поток забирает события пакетами и отправляет
+    их в sink. При переполнении очереди событие отбрасывается согласно
+    overflow_policy: drop_new - новое, drop_oldest - самое старое.
+    """
+
+    def __init__(
+        self,
+        max_size: int = AUDIT_QUEUE_SIZE,
+        overflow_policy: str = AUDIT_OVERFLOW_POLICY,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL,
+    ):
+        if overflow_policy not in (DROP_NEW, DROP_OLDEST):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.high_watermark = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._lock = Lock()
+        self._sink: Optional[AuditSink] = None
+        self._thread: Optional[Thread] = None
+        self._stopping = False
+
+    def log(self, action: str, details: dict, topic: str = AUDIT_TOPIC):
+        event = (topic, {
+            "action": action,
+            "details": details,
+            "time": datetime.now(timezone.utc).isoformat()
+        })
+
+        with self._lock:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow_policy == DROP_NEW:
+                    return
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self._queue.put_nowait(event)
+
+            self.enqueued += 1
+            self.high_watermark = max(self.high_watermark, self._queue.qsize())
+
+    def start(self, sink: AuditSink):
+        self._sink = sink
+        self._stopping = False
+        self._thread = Thread(target=self._run, name="audit-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+
+        self._stopping = True
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _take_batch(self) -> List[Tuple[str, dict]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = self._take_batch()
+
+            if not batch:
+                continue
+
+            try:
+                self._sink.send_batch(batch)
+                self.sent += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Failed to send audit events: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queue_size": self._queue.qsize(),
+            "queue_max_size": self._queue.maxsize,
+            "overflow_policy": self.overflow_policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "high_watermark": self.high_watermark,
+        }
+
+
+audit_log = AuditLog()
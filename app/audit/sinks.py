@@ -0,0 +1,124 @@
+import json
+import sys
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from kafka import KafkaProducer
+
+from app.config import KAFKA_HOST, KAFKA_PORT
+from app.metrics.registry import KAFKA_SENDS
+
+
+class AuditSink(ABC):
+    """
+    Получатель событий. send_batch должен либо доставить
+    все события пакета, либо выбросить исключение.
+    durable - события после send_batch не теряются;
+    только в такой sink можно отдавать события outbox.
+    """
+    durable = False
+
+    @abstractmethod
+    def send_batch(self, events: List[Tuple[str, dict]]):
+        ...
+
+    def close(self):
+        pass
+
+
+class KafkaAuditSink(AuditSink):
+    """
+    Отправка событий в Kafka сжатыми пакетами.
+    Продюсер создается при первой отправке; отправлять могут
+    поток аудита и поток relay, поэтому создание под блокировкой.
+    """
+    durable = True
+
+    def __init__(self, send_timeout: float = 30.0):
+        self.send_timeout = send_timeout
+        self._producer: Optional[KafkaProducer] = None
+        self._lock = Lock()
+
+    @property
+    def producer(self) -> KafkaProducer:
+        if self._producer is None:
+            with self._lock:
+                if self._producer is None:
+                    self._producer = KafkaProducer(
+                        bootstrap_servers=f"{KAFKA_HOST}:{KAFKA_PORT}",
+                        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+                        compression_type="gzip",
+                        batch_size=1048576,
+                        linger_ms=50
+                    )
+
+        return self._producer
+
+    def send_batch(self, events: List[Tuple[str, dict]]):
+        try:
+            futures = [self.producer.send(topic, payload) for topic, payload in events]
+            self.producer.flush(timeout=self.send_timeout)
+
+            for future in futures:
+                future.get(timeout=self.send_timeout)
+        except Exception:
+            KAFKA_SENDS.labels("failure").inc(len(events))
+            raise
+
+        KAFKA_SENDS.labels("success").inc(len(events))
+
+    def close(self):
+        with self._lock:
+            if self._producer is not None:
+                self._producer.close()
+                self._producer = None
+
+
+class StdoutAuditSink(AuditSink):
+    """
+    Печатает события в stdout построчно в JSON.
+    """
+
+    def send_batch(self, events: List[Tuple[str, dict]]):
+        lines = [json.dumps({"topic": topic, **payload}, ensure_ascii=False) for topic, payload in events]
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+
+class NullAuditSink(AuditSink):
+    """
+    Отбрасывает события.
+    """
+
+    def send_batch(self, events: List[Tuple[str, dict]]):
+        pass
+
+
+class InMemoryAuditSink(AuditSink):
+    """
+    Хранит отправленные события в списке. Для тестов и локального запуска без брокера.
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, dict]] = []
+        self.batches: List[int] = []
+
+    def send_batch(self, events: List[Tuple[str, dict]]):
+        self.events.extend(events)
+        self.batches.append(len(events))
+
+
+AUDIT_SINKS = {
+    "kafka": KafkaAuditSink,
+    "stdout": StdoutAuditSink,
+    "null": NullAuditSink,
+    "memory": InMemoryAuditSink,
+}
+
+
+def create_audit_sink(kind: str) -> AuditSink:
+    try:
+        return AUDIT_SINKS[kind]()
+    except KeyError:
+        raise ValueError(f"Unknown audit sink: {kind}")
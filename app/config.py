@@ -1,7 +1,66 @@
+from dataclasses import dataclass
+
 from environs import Env
 
 env = Env()
 env.read_env()
 
 KAFKA_HOST=env.str("KAFKA_HOST", default="kafka")
-KAFKA_PORT=env.str("KAFKA_PORT", default="29092")
\ No newline at end of file
+KAFKA_PORT=env.str("KAFKA_PORT", default="29092")
+TARIFF_CACHE_ENABLED=env.bool("TARIFF_CACHE_ENABLED", default=True)
+TARIFF_CACHE_TTL=env.float("TARIFF_CACHE_TTL", default=60.0)
+CALCULATE_BATCH_MAX_SIZE=env.int("CALCULATE_BATCH_MAX_SIZE", default=10000)
+CALCULATE_BATCHER_ENABLED=env.bool("CALCULATE_BATCHER_ENABLED", default=True)
+CALCULATE_BATCHER_MAX_SIZE=env.int("CALCULATE_BATCHER_MAX_SIZE", default=256)
+CALCULATE_BATCHER_MAX_WAIT=env.float("CALCULATE_BATCHER_MAX_WAIT", default=0.002)
+CALCULATE_PLAN_CACHE_MODE=env.str("CALCULATE_PLAN_CACHE_MODE", default="")
+UPLOAD_CHUNK_SIZE=env.int("UPLOAD_CHUNK_SIZE", default=5000)
+OUTBOX_RELAY_ENABLED=env.bool("OUTBOX_RELAY_ENABLED", default=True)
+OUTBOX_BATCH_SIZE=env.int("OUTBOX_BATCH_SIZE", default=500)
+OUTBOX_POLL_INTERVAL=env.float("OUTBOX_POLL_INTERVAL", default=1.0)
+AUDIT_SINK=env.str("AUDIT_SINK", default="kafka")
+AUDIT_QUEUE_SIZE=env.int("AUDIT_QUEUE_SIZE", default=10000)
+AUDIT_OVERFLOW_POLICY=env.str("AUDIT_OVERFLOW_POLICY", default="drop_new")
+AUDIT_BATCH_SIZE=env.int("AUDIT_BATCH_SIZE", default=500)
+AUDIT_FLUSH_INTERVAL=env.float("AUDIT_FLUSH_INTERVAL", default=0.5)
+METRICS_ENABLED=env.bool("METRICS_ENABLED", default=True)
+TARIFF_BOOK_VERSION_TTL=env.float("TARIFF_BOOK_VERSION_TTL", default=5.0)
+TARIFF_LIST_CACHE_SIZE=env.int("TARIFF_LIST_CACHE_SIZE", default=256)
+TARIFF_SNAPSHOT_ENABLED=env.bool("TARIFF_SNAPSHOT_ENABLED", default=False)
+TARIFF_SNAPSHOT_PATH=env.str("TARIFF_SNAPSHOT_PATH", default="/dev/shm/tariff_book.snapshot")
+TARIFF_SNAPSHOT_POLL_INTERVAL=env.float("TARIFF_SNAPSHOT_POLL_INTERVAL", default=1.0)
+TARIFF_SNAPSHOT_CHECK_INTERVAL=env.float("TARIFF_SNAPSHOT_CHECK_INTERVAL", default=0.5)
+EXPORT_BATCH_SIZE=env.int("EXPORT_BATCH_SIZE", default=5000)
+IMPORT_MAX_ERRORS=env.int("IMPORT_MAX_ERRORS", default=100)
+TARIFF_BATCH_MAX_SIZE=env.int("TARIFF_BATCH_MAX_SIZE", default=5000)
+REPRICING_CHUNK_SIZE=env.int("REPRICING_CHUNK_SIZE", default=100000)
+TARIFF_CHANGES_POLL_INTERVAL=env.float("TARIFF_CHANGES_POLL_INTERVAL", default=0.5)
+TARIFF_CHANGES_MAX_WAIT=env.float("TARIFF_CHANGES_MAX_WAIT", default=30.0)
+TARIFF_PARTITION_MAINTENANCE_ENABLED=env.bool("TARIFF_PARTITION_MAINTENANCE_ENABLED", default=True)
+TARIFF_PARTITION_YEARS_AHEAD=env.int("TARIFF_PARTITION_YEARS_AHEAD", default=1)
+TARIFF_PARTITION_CHECK_INTERVAL=env.float("TARIFF_PARTITION_CHECK_INTERVAL", default=3600.0)
+TARIFF_PARTITION_RETENTION_YEARS=env.int("TARIFF_PARTITION_RETENTION_YEARS", default=0)
+TARIFF_ARCHIVE_SCHEMA=env.str("TARIFF_ARCHIVE_SCHEMA", default="tariff_archive")
+PROFILING_ENABLED=env.bool("PROFILING_ENABLED", default=False)
+PROFILING_TOKEN=env.str("PROFILING_TOKEN", default="")
+PROFILING_DIR=env.str("PROFILING_DIR", default="/tmp/profiles")
+PROFILING_INTERVAL=env.float("PROFILING_INTERVAL", default=0.001)
+STARTUP_WARMUP_CONNECTIONS=env.int("STARTUP_WARMUP_CONNECTIONS", default=5)
+STARTUP_PRELOAD_TARIFFS=env.bool("STARTUP_PRELOAD_TARIFFS", default=True)
+
+
+@dataclass(frozen=True)
+class AppSettings:
+    """
+    Настройки сборки приложения в create_app. По умолчанию - из окружения.
+    """
+    metrics_enabled: bool = METRICS_ENABLED
+    audit_sink: str = AUDIT_SINK
+    outbox_relay_enabled: bool = OUTBOX_RELAY_ENABLED
+    snapshot_publisher_enabled: bool = TARIFF_SNAPSHOT_ENABLED
+    partition_maintenance_enabled: bool = TARIFF_PARTITION_MAINTENANCE_ENABLED
+    warmup_connections: int = STARTUP_WARMUP_CONNECTIONS
+    preload_tariffs: bool = STARTUP_PRELOAD_TARIFFS
+    profiling_enabled: bool = PROFILING_ENABLED
+    profiling_token: str = PROFILING_TOKEN
+    profiling_dir: str = PROFILING_DIR
@@ -0,0 +1,140 @@
+"""
+Склейка одновременных запросов ставки для /insurance/calculate.
+
+Запросы, пришедшие в пределах окна max_wait, собираются в пакет,
+одинаковые (date, cargo_type) схлопываются, и пакет разрешается одним
+запросом get_rates_for_dates. Результат раздается всем ожидающим.
+"""
+import asyncio
+from datetime import date
+from typing import Callable, Dict, Optional, Set, Tuple, Type
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import CALCULATE_BATCHER_MAX_SIZE, CALCULATE_BATCHER_MAX_WAIT
+from app.crud.tariffs import get_rates_for_dates
+from app.metrics.registry import CALCULATE_BATCH_KEYS, CALCULATE_BATCH_REQUESTS
+from app.utils.exceptions import TariffDateNotFound, TariffForCalculateNotFound
+
+RateKey = Tuple[date, str]
+RateResult = Tuple[Optional[float], Optional[Type[Exception]]]
+
+
+class RateLookupBatcher:
+    """
+    Пакет отправляется по таймеру max_wait от первого запроса
+    или сразу при достижении max_batch_size разных ключей.
+    Соединение для пакета берется из фабрики первого запроса.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = CALCULATE_BATCHER_MAX_SIZE,
+        max_wait: float = CALCULATE_BATCHER_MAX_WAIT,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self.keys = 0
+        self._pending: Dict[RateKey, asyncio.Future] = {}
+        self._pending_requests = 0
+        self._conn_factory: Optional[Callable[[], AsyncConnection]] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def get_rate(
+        self, conn_factory: Callable[[], AsyncConnection], on_date: date, cargo_type: str
+    ) -> float:
+        key = (on_date, cargo_type)
+        future = self._pending.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+
+            if self._conn_factory is None:
+                self._conn_factory = conn_factory
+
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+
+        self._pending_requests += 1
+
+        # отмена одного запроса не должна отменять общий результат
+        rate, error = await asyncio.shield(future)
+
+        if error is not None:
+            raise error
+
+        return rate
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, requests, conn_factory = self._pending, self._pending_requests, self._conn_factory
+        self._pending, self._pending_requests, self._conn_factory = {}, 0, None
+
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._resolve(conn_factory, batch, requests))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(
+        self,
+        conn_factory: Callable[[], AsyncConnection],
+        batch: Dict[RateKey, asyncio.Future],
+        requests: int,
+    ):
+        self.batches += 1
+        self.requests += requests
+        self.keys += len(batch)
+        CALCULATE_BATCH_KEYS.observe(len(batch))
+        CALCULATE_BATCH_REQUESTS.observe(requests)
+
+        try:
+            async with conn_factory() as conn:
+                rates = await get_rates_for_dates(conn, batch)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (on_date, cargo_type), future in batch.items():
+            if not future.done():
+                future.set_result(self._pick_rate(rates.get(on_date), cargo_type))
+
+    @staticmethod
+    def _pick_rate(date_rates: Optional[Dict[str, float]], cargo_type: str) -> RateResult:
+        if date_rates is None:
+            return None, TariffDateNotFound
+
+        rate = date_rates.get(cargo_type, date_rates.get("Other"))
+
+        if rate is None:
+            return None, TariffForCalculateNotFound
+
+        return rate, None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "keys": self.keys,
+            "avg_batch_requests": self.requests / self.batches if self.batches else 0.0,
+            "avg_batch_keys": self.keys / self.batches if self.batches else 0.0,
+            "pending": len(self._pending),
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+        }
+
+
+rate_batcher = RateLookupBatcher()
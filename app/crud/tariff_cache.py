@@ -0,0 +1,246 @@
+import asyncio
+from bisect import bisect_right
+from datetime import date
+from threading import RLock
+from time import monotonic
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import TARIFF_CACHE_TTL
+from app.crud.tariff_version import (VERSION_ROW_ID, TariffBookVersionTracker,
+                                     tariff_book_version)
+from app.utils.exceptions import TariffDateNotFound, TariffForCalculateNotFound
+from database.models import Tariff, TariffBookVersion, TariffDate
+
+OTHER_CARGO_TYPE = "Other"
+
+RateLookup = Callable[[date, str], Awaitable[float]]
+
+
+class TariffTimelineCache:
+    """
+    Копия тарифной книги в памяти процесса для расчета стоимости страхования.
+
+    Хранит отсортированный список дат начала действия тарифов и для каждой
+    даты словарь cargo_type -> rate. Поиск действующей даты - бинарный.
+    Кэш загружается целиком при первом обращении, сбрасывается при загрузке
+    тарифов и точечно правится при обновлении/удалении тарифа.
+    Изменения других воркеров кэш замечает по версии тарифной книги: книга
+    загружается вместе со своей версией, и если versions знает более новую
+    (versions перечитывает ее не реже своего ttl), кэш считается устаревшим.
+    TTL кэша - страховка на случай рассинхронизации версий.
+
+    Каждое изменение (invalidate, set_rate, drop_rate) увеличивает поколение.
+    Загрузка, во время которой поколение сменилось, могла прочитать книгу
+    до коммита изменения и не публикуется. Книгу загружает один запрос,
+    остальные промахи ждут его или отвечаются точечным запросом ставки.
+    """
+
+    def __init__(self, ttl: float = TARIFF_CACHE_TTL, versions: TariffBookVersionTracker = tariff_book_version):
+        self.ttl = ttl
+        self.versions = versions
+        self.hits = 0
+        self.misses = 0
+        self.discarded_loads = 0
+        self.miss_lookups = 0
+        self._lock = RLock()
+        self._dates: List[date] = []
+        self._rates: List[Dict[str, float]] = []
+        self._loaded_at: Optional[float] = None
+        self._version = 0
+        self._generation = 0
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._version_lock: Optional[asyncio.Lock] = None
+        self._locks_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _is_loaded(self) -> bool:
+        if self._loaded_at is None:
+            return False
+
+        return not self.ttl or monotonic() - self._loaded_at < self.ttl
+
+    def _is_current(self, known_version: int) -> bool:
+        return self._is_loaded() and self._version >= known_version
+
+    def _get_locks(self) -> Tuple[asyncio.Lock, asyncio.Lock]:
+        # asyncio.Lock привязывается к циклу событий при первом ожидании
+        loop = asyncio.get_running_loop()
+        if self._locks_loop is not loop:
+            self._load_lock = asyncio.Lock()
+            self._version_lock = asyncio.Lock()
+            self._locks_loop = loop
+
+        return self._load_lock, self._version_lock
+
+    async def _known_version(self, conn_factory: Callable[[], AsyncConnection]) -> int:
+        """
+        Последняя известная версия книги. Когда она устарела, ее перечитывает
+        один запрос, остальные берут прежнее значение, не дожидаясь.
+        """
+        _, version_lock = self._get_locks()
+
+        if not self.versions.is_fresh() and not version_lock.locked():
+            async with version_lock:
+                async with conn_factory() as conn:
+                    await self.versions.get(conn)
+
+        return self.versions.known
+
+    async def load(self, db: AsyncConnection | AsyncSession) -> Tuple[List[date], List[Dict[str, float]]]:
+        """
+        Читает книгу и публикует ее, если за время чтения кэш не менялся.
+        Возвращает прочитанные даты и ставки в любом случае.
+        """
+        with self._lock:
+            generation = self._generation
+
+        # версия в том же запросе, что и книга, - из того же снимка
+        version = func.coalesce(
+            select(TariffBookVersion.version).where(TariffBookVersion.id == VERSION_ROW_ID).scalar_subquery(), 0
+        )
+        result = await db.execute(
+            select(version, TariffDate.date, Tariff.cargo_type, Tariff.rate)
+            .outerjoin(Tariff, Tariff.date_id == TariffDate.id)
+            .order_by(TariffDate.date)
+        )
+        rows = result.all()
+
+        dates: List[date] = []
+        rates: List[Dict[str, float]] = []
+        loaded_version = 0
+
+        for loaded_version, tariff_date, cargo_type, rate in rows:
+            if not dates or dates[-1] != tariff_date:
+                dates.append(tariff_date)
+                rates.append({})
+            if cargo_type is not None:
+                rates[-1][cargo_type] = rate
+
+        with self._lock:
+            if self._generation == generation:
+                self._dates = dates
+                self._rates = rates
+                self._version = loaded_version
+                self._loaded_at = monotonic()
+            else:
+                self.discarded_loads += 1
+
+        return dates, rates
+
+    async def get_rate(
+        self,
+        conn_factory: Callable[[], AsyncConnection],
+        on_date: date,
+        cargo_type: str,
+        miss_lookup: Optional[RateLookup] = None,
+    ) -> float:
+        """
+        Ставка из кэша. Соединение открывается только для загрузки книги
+        и перечитывания версии книги.
+        Пока книгу загружает другой запрос, промахи отвечает miss_lookup
+        (точечный запрос ставки), если он передан, иначе ждут загрузки.
+        """
+        load_lock, _ = self._get_locks()
+        # версию проверяет только попадание: загрузка и так читает свежую
+        known_version = await self._known_version(conn_factory) if self._is_loaded() else 0
+
+        if self._is_current(known_version):
+            self.hits += 1
+            with self._lock:
+                dates, rates = self._dates, self._rates
+        elif miss_lookup is not None and load_lock.locked():
+            self.misses += 1
+            self.miss_lookups += 1
+            return await miss_lookup(on_date, cargo_type)
+        else:
+            async with load_lock:
+                # книгу мог уже загрузить запрос, державший блокировку
+                if self._is_current(known_version):
+                    self.hits += 1
+                    with self._lock:
+                        dates, rates = self._dates, self._rates
+                else:
+                    self.misses += 1
+                    # неопубликованная загрузка все равно годится для этого запроса
+                    async with conn_factory() as conn:
+                        dates, rates = await self.load(conn)
+
+        with self._lock:
+            index = bisect_right(dates, on_date) - 1
+
+            if index < 0:
+                raise TariffDateNotFound
+
+            date_rates = rates[index]
+            rate = date_rates.get(cargo_type)
+
+            if rate is None:
+                rate = date_rates.get(OTHER_CARGO_TYPE)
+
+            if rate is None:
+                raise TariffForCalculateNotFound
+
+            return rate
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+
+    def _advance_version(self, version: Optional[int]):
+        # правка версии version продолжает книгу, только если кэш не пропустил
+        # предыдущих версий; пакет правит кэш несколько раз одной версией
+        if version is not None and self._version >= version - 1:
+            self._version = max(self._version, version)
+
+    def set_rate(self, tariff_date: date, cargo_type: str, rate: float, version: Optional[int] = None):
+        with self._lock:
+            self._generation += 1
+
+            if self._loaded_at is None:
+                return
+
+            index = bisect_right(self._dates, tariff_date) - 1
+
+            if index < 0 or self._dates[index] != tariff_date:
+                self.invalidate()
+                return
+
+            self._rates[index][cargo_type] = rate
+            self._advance_version(version)
+
+    def drop_rate(self, tariff_date: date, cargo_type: str, version: Optional[int] = None):
+        with self._lock:
+            self._generation += 1
+
+            if self._loaded_at is None:
+                return
+
+            index = bisect_right(self._dates, tariff_date) - 1
+
+            if index < 0 or self._dates[index] != tariff_date:
+                self.invalidate()
+                return
+
+            self._rates[index].pop(cargo_type, None)
+            self._advance_version(version)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "discarded_loads": self.discarded_loads,
+                "miss_lookups": self.miss_lookups,
+                "dates": len(self._dates),
+                "version": self._version,
+                "loaded": self._loaded_at is not None,
+            }
+
+
+tariff_cache = TariffTimelineCache()
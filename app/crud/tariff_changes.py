@@ -0,0 +1,109 @@
+"""
+Журнал изменений тарифов для потребителей, которые держат у себя копию книги.
+
+Каждое изменение тарифов пишет в tariff_changes строки с версией тарифной
+книги своей транзакции. Версия выдается под блокировкой строки версии до
+commit, поэтому порядок версий совпадает с порядком коммитов: прочитав все
+изменения с версией <= N, потребитель уже не увидит новых строк с версией <= N.
+"""
+import asyncio
+from contextlib import suppress
+from datetime import date
+from time import monotonic
+from typing import AsyncIterator, Callable, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import TARIFF_CHANGES_POLL_INTERVAL
+from database.models import TariffChange
+
+CHANGE_UPSERT = "upsert"
+CHANGE_DELETE = "delete"
+
+
+async def record_tariff_changes(
+    db: AsyncSession, version: int, op: str, rows: Iterable[Tuple[date, str, Optional[float]]]
+):
+    """
+    Пишет изменения (дата, cargo_type, ставка) в журнал в текущей транзакции.
+    """
+    changes = [
+        {"version": version, "op": op, "date": tariff_date, "cargo_type": cargo_type, "rate": rate}
+        for tariff_date, cargo_type, rate in rows
+    ]
+
+    if changes:
+        await db.execute(insert(TariffChange), changes)
+
+
+async def latest_change_version(conn: AsyncConnection | AsyncSession) -> int:
+    result = await conn.execute(select(func.max(TariffChange.version)))
+
+    return result.scalar() or 0
+
+
+async def stream_tariff_changes(
+    conn: AsyncConnection, since: int, batch_size: int
+) -> AsyncIterator[Sequence[Tuple[int, str, date, str, Optional[float]]]]:
+    """
+    Изменения с версией больше since в порядке применения, пакетами
+    по batch_size через серверный курсор. Запрос видит один снимок БД,
+    поэтому после него у потребителя есть все изменения до версии последней строки.
+    """
+    result = await conn.stream(
+        select(TariffChange.version, TariffChange.op, TariffChange.date, TariffChange.cargo_type, TariffChange.rate)
+        .where(TariffChange.version > since)
+        .order_by(TariffChange.version, TariffChange.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    async for rows in result.partitions():
+        yield rows
+
+
+class TariffChangeFeed:
+    """
+    Ожидание новых изменений для long-poll. Версия журнала перечитывается
+    не реже раза в poll_interval, notify() будит ожидающих сразу после
+    локального изменения тарифов.
+    """
+
+    def __init__(self, poll_interval: float = TARIFF_CHANGES_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.waiting = 0
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, connect: Callable[[], AsyncConnection], since: int, timeout: float) -> int:
+        """
+        Последняя версия журнала, как только она станет больше since,
+        или по истечении timeout. Соединение на время ожидания не держится.
+        """
+        deadline = monotonic() + timeout
+        self.waiting += 1
+
+        try:
+            while True:
+                changed = self._changed
+
+                async with connect() as conn:
+                    latest = await latest_change_version(conn)
+
+                remaining = deadline - monotonic()
+                if latest > since or remaining <= 0:
+                    return latest
+
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(changed.wait(), min(self.poll_interval, remaining))
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        return {"waiting": self.waiting, "poll_interval": self.poll_interval}
+
+
+tariff_change_feed = TariffChangeFeed()
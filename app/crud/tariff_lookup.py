@@ -0,0 +1,66 @@
+"""
+Быстрые запросы для расчета без ORM.
+
+Запросы собраны один раз на уровне модуля по таблицам (Core) с bindparam,
+поэтому SQLAlchemy компилирует каждый из них единожды и дальше берет из
+кэша компиляции. Работают поверх AsyncConnection, без Session и identity map,
+и возвращают простые кортежи.
+"""
+from datetime import date
+
+from sqlalchemy import Date, bindparam, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import CALCULATE_PLAN_CACHE_MODE
+from app.crud.tariff_validity import effective_on
+from app.utils.exceptions import TariffDateNotFound, TariffForCalculateNotFound
+from database.models import Tariff, TariffDate
+
+tariff_dates = TariffDate.__table__
+tariffs = Tariff.__table__
+
+_effective_date = (
+    select(tariff_dates.c.id, tariff_dates.c.date)
+    .where(effective_on(bindparam("on_date", type_=Date)))
+    .cte("effective_date")
+)
+
+# SET LOCAL не принимает параметры, set_config(..., true) - то же самое
+SET_PLAN_CACHE_MODE = text("SELECT set_config('plan_cache_mode', :mode, true)")
+
+RATE_FOR_CALCULATE = (
+    select(_effective_date.c.id, tariffs.c.rate)
+    .select_from(_effective_date)
+    .outerjoin(
+        tariffs,
+        (tariffs.c.date_id == _effective_date.c.id)
+        & (tariffs.c.date == _effective_date.c.date)
+        & tariffs.c.cargo_type.in_([bindparam("cargo_type"), literal("Other")]),
+    )
+    .order_by(tariffs.c.cargo_type == literal("Other"))
+    .limit(1)
+)
+
+
+async def lookup_rate_for_calculate(
+    conn: AsyncConnection, on_date: date, cargo_type: str, plan_cache_mode: str = CALCULATE_PLAN_CACHE_MODE
+) -> float:
+    """
+    Действующая ставка на дату с откатом на "Other" одним запросом.
+    plan_cache_mode задается до конца транзакции соединения: общий план
+    не планирует заново все секции tariffs на каждом вызове, лишние
+    секции отсекаются при выполнении.
+    """
+    if plan_cache_mode:
+        await conn.execute(SET_PLAN_CACHE_MODE, {"mode": plan_cache_mode})
+
+    result = await conn.execute(RATE_FOR_CALCULATE, {"on_date": on_date, "cargo_type": cargo_type})
+    row = result.first()
+
+    if not row:
+        raise TariffDateNotFound
+
+    if row.rate is None:
+        raise TariffForCalculateNotFound
+
+    return row.rate
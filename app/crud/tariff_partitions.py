@@ -0,0 +1,265 @@
+"""
+Годовые секции tariffs: создание на будущее и архивирование старых.
+
+Секция года Y - tariffs_y<Y> для дат [Y-01-01, Y+1-01-01). Строки без
+своей секции (загрузка далекого прошлого или будущего) ложатся в
+tariffs_default; при обслуживании они переносятся в новую секцию года.
+Обслуживание выполняется под advisory-блокировкой, поэтому воркеры
+не создают одну секцию дважды.
+"""
+import asyncio
+import logging
+import re
+from datetime import date
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (TARIFF_ARCHIVE_SCHEMA, TARIFF_PARTITION_CHECK_INTERVAL,
+                        TARIFF_PARTITION_RETENTION_YEARS,
+                        TARIFF_PARTITION_YEARS_AHEAD)
+from app.crud.tariff_cache import tariff_cache
+from app.crud.tariff_changes import CHANGE_DELETE, tariff_change_feed
+from app.crud.tariff_version import (bump_tariff_book_version,
+                                     tariff_book_version)
+from app.crud.tariffs import add_tariff_change_event
+from app.snapshot.publisher import snapshot_publisher
+from database.session import session_local
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "tariffs"
+DEFAULT_PARTITION = "tariffs_default"
+PARTITION_NAME = re.compile(r"^tariffs_y(\d{4})$")
+
+PARTITIONS_LOCK = text("SELECT pg_advisory_xact_lock(hashtext('tariff_partitions'))")
+
+# родитель через regclass - по search_path, как и остальной SQL модуля
+LIST_PARTITIONS = text("""
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+""")
+
+
+RECORD_ARCHIVED_CHANGES = text(f"""
+    INSERT INTO tariff_changes (version, op, date, cargo_type, rate)
+    SELECT :version, :op, date, cargo_type, NULL
+    FROM {PARENT_TABLE}
+    WHERE date < :before
+    ORDER BY date, cargo_type
+""")
+
+
+def partition_name(year: int) -> str:
+    return f"tariffs_y{year}"
+
+
+async def get_partition_years(db: AsyncSession) -> Set[int]:
+    result = await db.execute(LIST_PARTITIONS, {"parent": PARENT_TABLE})
+
+    return {
+        int(match.group(1))
+        for match in map(PARTITION_NAME.match, result.scalars())
+        if match
+    }
+
+
+async def create_year_partition(db: AsyncSession, year: int):
+    """
+    Секция года с переносом строк этого года из tariffs_default:
+    Postgres не подключает секцию, пока такие строки лежат в default.
+    """
+    name = partition_name(year)
+    bounds = {"start": date(year, 1, 1), "end": date(year + 1, 1, 1)}
+
+    await db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+    await db.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    # границы литералами: ATTACH не принимает параметры
+    await db.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+
+
+async def ensure_tariff_partitions(
+    db: AsyncSession, years_ahead: int = TARIFF_PARTITION_YEARS_AHEAD, today: Optional[date] = None
+) -> List[str]:
+    """
+    Создает секции с текущего года на years_ahead лет вперед и для всех
+    лет, чьи строки лежат в tariffs_default. Без коммита.
+    Возвращает имена созданных секций.
+    """
+    today = today or date.today()
+    await db.execute(PARTITIONS_LOCK)
+
+    result = await db.execute(text(f"SELECT DISTINCT extract(year FROM date)::int FROM {DEFAULT_PARTITION}"))
+    years = set(result.scalars()) | set(range(today.year, today.year + years_ahead + 1))
+    missing = sorted(years - await get_partition_years(db))
+
+    for year in missing:
+        await create_year_partition(db, year)
+
+    return [partition_name(year) for year in missing]
+
+
+async def archive_tariff_partitions(
+    db: AsyncSession, before_year: int, schema: str = TARIFF_ARCHIVE_SCHEMA
+) -> List[str]:
+    """
+    Отсоединяет секции лет раньше before_year и переносит их в схему
+    архива, а даты тарифов этих лет удаляет из книги. Без коммита
+    и без новой версии книги - см. archive_old_tariffs.
+    Возвращает имена архивированных секций.
+    """
+    # строки старых лет из default сначала получают свои секции
+    await ensure_tariff_partitions(db)
+
+    years = sorted(year for year in await get_partition_years(db) if year < before_year)
+    if not years:
+        return []
+
+    await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+
+    for year in years:
+        name = partition_name(year)
+        await db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+
+        # иначе удаление дат из tariff_dates каскадом очистит архив
+        result = await db.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'f'"
+        ), {"name": name})
+        for constraint in result.scalars():
+            await db.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+
+        await db.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+
+    await db.execute(text("DELETE FROM tariff_dates WHERE date < :before"), {"before": date(before_year, 1, 1)})
+
+    return [f"{schema}.{partition_name(year)}" for year in years]
+
+
+async def archive_old_tariffs(db: AsyncSession, before_year: int) -> List[str]:
+    """
+    Архивирует секции лет раньше before_year в одной транзакции
+    с новой версией тарифной книги, удалением архивных тарифов в журнале
+    изменений и событием в outbox, и сбрасывает кэши тарифов.
+    """
+    # строки старых лет из default получают свои секции до блокировки версии
+    await ensure_tariff_partitions(db)
+    await db.commit()
+
+    if not any(year < before_year for year in await get_partition_years(db)):
+        await db.commit()
+        return []
+
+    # версия первой, как во всех изменениях тарифов: они ждут ее строку,
+    # не держа блокировок на tariffs, и DETACH не ждет их по кругу.
+    # Журнал пишется одним INSERT ... SELECT до DETACH: тарифы старых лет
+    # уже не меняются, а ACCESS EXCLUSIVE на время копирования не нужна
+    version = await bump_tariff_book_version(db)
+    await db.execute(RECORD_ARCHIVED_CHANGES, {
+        "version": version, "op": CHANGE_DELETE, "before": date(before_year, 1, 1)
+    })
+    archived = await archive_tariff_partitions(db, before_year)
+
+    if not archived:
+        await db.rollback()
+        return archived
+
+    add_tariff_change_event(db, "archive_tariffs", {
+        "before_date": date(before_year, 1, 1).isoformat(),
+        "partitions": archived,
+    })
+    await db.commit()
+    tariff_cache.invalidate()
+    tariff_book_version.observe(version)
+    snapshot_publisher.notify()
+    tariff_change_feed.notify()
+
+    return archived
+
+
+async def get_tariff_partitions(db: AsyncSession) -> List[dict]:
+    """
+    Секции tariffs с границами и оценкой числа строк.
+    """
+    result = await db.execute(text("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = CAST(:parent AS regclass)
+        ORDER BY child.relname
+    """), {"parent": PARENT_TABLE})
+
+    return [
+        {"name": name, "bounds": bounds, "rows_estimate": max(rows, 0)}
+        for name, bounds, rows in result.all()
+    ]
+
+
+class TariffPartitionMaintainer:
+    """
+    Фоновое обслуживание секций: раз в check_interval создает недостающие
+    секции и, если задан retention_years, архивирует секции старше.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        check_interval: float = TARIFF_PARTITION_CHECK_INTERVAL,
+        retention_years: int = TARIFF_PARTITION_RETENTION_YEARS,
+    ):
+        self.session_factory = session_factory
+        self.check_interval = check_interval
+        self.retention_years = retention_years
+
+        self.created = 0
+        self.archived = 0
+        self.failures = 0
+
+    async def run_once(self, today: Optional[date] = None) -> List[str]:
+        today = today or date.today()
+
+        async with self.session_factory() as db:
+            if db.bind.dialect.name != "postgresql":
+                return []
+
+            changed = await ensure_tariff_partitions(db, today=today)
+            await db.commit()
+            self.created += len(changed)
+
+            if self.retention_years:
+                archived = await archive_old_tariffs(db, today.year - self.retention_years)
+                self.archived += len(archived)
+                changed += archived
+
+        return changed
+
+    async def run(self):
+        while True:
+            try:
+                changed = await self.run_once()
+                if changed:
+                    logger.info(f"Tariff partitions changed: {', '.join(changed)}")
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to maintain tariff partitions: {e}")
+
+            await asyncio.sleep(self.check_interval)
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "archived": self.archived,
+            "failures": self.failures,
+            "retention_years": self.retention_years,
+        }
+
+
+tariff_partition_maintainer = TariffPartitionMaintainer(session_local)
@@ -0,0 +1,84 @@
+"""
+Интервалы действия тарифных дат.
+
+У каждой TariffDate интервал [date, valid_to), где valid_to - следующая
+дата тарифов (NULL для последней). Интервалы пересчитываются в транзакции
+загрузки тарифов, а exclusion-ограничение ex_tariff_dates_validity
+(GiST по daterange(date, valid_to)) не дает им пересечься и служит
+индексом для поиска действующей даты.
+"""
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import Boolean, ColumnElement, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import TariffDate
+
+tariff_dates = TariffDate.__table__
+
+
+def effective_on(on_date: ColumnElement[date]) -> ColumnElement[bool]:
+    """
+    Условие "интервал даты тарифов содержит on_date".
+    Выражение совпадает с выражением GiST-индекса.
+    """
+    return func.daterange(tariff_dates.c.date, tariff_dates.c.valid_to).op(
+        "@>", return_type=Boolean
+    )(on_date)
+
+
+def _next_dates(from_date: Optional[date] = None):
+    query = select(
+        tariff_dates.c.id,
+        tariff_dates.c.date,
+        tariff_dates.c.valid_to,
+        func.lead(tariff_dates.c.date).over(order_by=tariff_dates.c.date).label("expected_valid_to"),
+    )
+
+    if from_date is not None:
+        # окно начинается с предыдущей даты: ее valid_to тоже мог измениться
+        previous_date = (
+            select(func.max(tariff_dates.c.date))
+            .where(tariff_dates.c.date < from_date)
+            .scalar_subquery()
+        )
+        query = query.where(tariff_dates.c.date >= func.coalesce(previous_date, from_date))
+
+    return query.subquery("next_dates")
+
+
+async def refresh_tariff_validity(db: AsyncSession, from_date: Optional[date] = None) -> int:
+    """
+    Пересчитывает valid_to для дат начиная с from_date (и предыдущей перед ней)
+    без коммита. Без from_date пересчитывается вся таблица.
+    Возвращает количество измененных строк.
+    """
+    next_dates = _next_dates(from_date)
+
+    result = await db.execute(
+        update(tariff_dates)
+        .where(
+            tariff_dates.c.id == next_dates.c.id,
+            tariff_dates.c.valid_to.is_distinct_from(next_dates.c.expected_valid_to),
+        )
+        .values(valid_to=next_dates.c.expected_valid_to)
+    )
+
+    return result.rowcount
+
+
+async def find_validity_mismatches(db: AsyncSession, limit: int = 100) -> List[dict]:
+    """
+    Даты, у которых valid_to не совпадает со следующей датой тарифов.
+    """
+    next_dates = _next_dates()
+
+    result = await db.execute(
+        select(next_dates)
+        .where(next_dates.c.valid_to.is_distinct_from(next_dates.c.expected_valid_to))
+        .order_by(next_dates.c.date)
+        .limit(limit)
+    )
+
+    return [dict(row._mapping) for row in result]
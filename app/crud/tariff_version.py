@@ -0,0 +1,92 @@
+from threading import RLock
+from time import monotonic
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import TARIFF_BOOK_VERSION_TTL
+from database.models import TariffBookVersion
+
+VERSION_ROW_ID = 1
+
+
+async def bump_tariff_book_version(db: AsyncSession) -> int:
+    """
+    Увеличивает версию тарифной книги в текущей транзакции.
+    Строка версии блокируется до конца транзакции, поэтому
+    параллельные изменения тарифов получают разные версии.
+    """
+    result = await db.execute(
+        insert(TariffBookVersion)
+        .values(id=VERSION_ROW_ID, version=1)
+        .on_conflict_do_update(
+            index_elements=[TariffBookVersion.id],
+            set_={"version": TariffBookVersion.version + 1}
+        )
+        .returning(TariffBookVersion.version)
+    )
+
+    return result.scalar_one()
+
+
+async def read_tariff_book_version(db: AsyncConnection | AsyncSession) -> int:
+    """
+    Версия тарифной книги, какой ее видит текущая транзакция db.
+    """
+    result = await db.execute(
+        select(TariffBookVersion.version).where(TariffBookVersion.id == VERSION_ROW_ID)
+    )
+
+    return result.scalar() or 0
+
+
+class TariffBookVersionTracker:
+    """
+    Последняя известная процессу версия тарифной книги.
+
+    Свои изменения процесс учитывает сразу после commit, изменения
+    других воркеров - после перечитывания версии из БД, не реже раза в ttl.
+    Пока версия свежая, ее можно отдавать без обращения к БД.
+    """
+
+    def __init__(self, ttl: float = TARIFF_BOOK_VERSION_TTL):
+        self.ttl = ttl
+        self._lock = RLock()
+        self._version = 0
+        self._loaded_at: Optional[float] = None
+
+    def is_fresh(self) -> bool:
+        if self._loaded_at is None:
+            return False
+
+        return not self.ttl or monotonic() - self._loaded_at < self.ttl
+
+    async def get(self, db: AsyncConnection | AsyncSession) -> int:
+        if self.is_fresh():
+            return self._version
+
+        self.observe(await read_tariff_book_version(db))
+
+        return self._version
+
+    @property
+    def known(self) -> int:
+        """
+        Последняя известная версия без обращения к БД.
+        """
+        return self._version
+
+    def observe(self, version: int):
+        with self._lock:
+            self._version = max(self._version, version)
+            self._loaded_at = monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._version = 0
+            self._loaded_at = None
+
+
+tariff_book_version = TariffBookVersionTracker()
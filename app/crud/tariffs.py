@@ -1,100 +1,477 @@
-from datetime import date
-from typing import Optional
-
-from sqlalchemy import delete, desc, select
-from sqlalchemy.orm import Session
-
-from app.utils.exceptions import (TariffDateNotFound,
-                                  TariffForCalculateNotFound, TariffNotFound)
-from database.models import Tariff, TariffDate
-
-
-def get_tariff_date(db: Session, date: date | str) -> Optional[TariffDate]:
-    result = db.execute(select(TariffDate).where(TariffDate.date == date))
+from datetime import date, datetime, timezone
+from typing import (AsyncIterable, AsyncIterator, Dict, Iterable, List,
+                    Optional, Sequence, Tuple, Type)
+
+from sqlalchemy import (Date, Float, String, column, delete, func, literal,
+                        select, text, update, values)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.crud.tariff_cache import tariff_cache
+from app.crud.tariff_changes import (CHANGE_DELETE, CHANGE_UPSERT,
+                                     record_tariff_changes, tariff_change_feed)
+from app.crud.tariff_validity import effective_on, refresh_tariff_validity
+from app.crud.tariff_version import (bump_tariff_book_version,
+                                     tariff_book_version)
+from app.snapshot.publisher import snapshot_publisher
+from app.utils.exceptions import TariffDateNotFound, TariffNotFound
+from app.utils.tariff_csv import TariffCsvErrors
+from database.models import Tariff, TariffChangeOutbox, TariffDate
+
+TARIFF_CHANGES_TOPIC = "tariff_changes"
+
+IMPORT_STAGING_TABLE = "tariff_import_staging"
+
+CREATE_IMPORT_STAGING = text(f"""
+    CREATE TEMP TABLE {IMPORT_STAGING_TABLE} (
+        line_no integer NOT NULL,
+        date date NOT NULL,
+        cargo_type text NOT NULL,
+        rate double precision NOT NULL
+    ) ON COMMIT DROP
+""")
+
+# даты вставляются отдельным запросом, как в upsert_tariffs: CTE с INSERT
+# не виден основному запросу, а даты параллельной загрузки не видны снимку
+# запроса, поэтому tariffs получали бы date_id NULL. DO UPDATE блокирует
+# строки дат до конца транзакции
+MERGE_IMPORT_DATES = text(f"""
+    INSERT INTO tariff_dates (date)
+    SELECT DISTINCT date FROM {IMPORT_STAGING_TABLE}
+    ORDER BY date
+    ON CONFLICT (date) DO UPDATE SET date = EXCLUDED.date
+""")
+
+# при повторе пары (дата, cargo_type) побеждает последняя строка файла
+MERGE_IMPORT_STAGING = text(f"""
+    WITH src AS (
+        SELECT DISTINCT ON (date, cargo_type) date, cargo_type, rate
+        FROM {IMPORT_STAGING_TABLE}
+        ORDER BY date, cargo_type, line_no DESC
+    )
+    INSERT INTO tariffs (date_id, date, cargo_type, rate)
+    SELECT tariff_dates.id, src.date, src.cargo_type, src.rate
+    FROM src
+    JOIN tariff_dates ON tariff_dates.date = src.date
+    ON CONFLICT (date_id, cargo_type, date) DO UPDATE SET rate = EXCLUDED.rate
+""")
+
+RECORD_IMPORT_CHANGES = text(f"""
+    INSERT INTO tariff_changes (version, op, date, cargo_type, rate)
+    SELECT DISTINCT ON (date, cargo_type) :version, :op, date, cargo_type, rate
+    FROM {IMPORT_STAGING_TABLE}
+    ORDER BY date, cargo_type, line_no DESC
+""")
+
+
+async def get_tariff_date(db: AsyncSession, date: date | str) -> Optional[TariffDate]:
+    result = await db.execute(select(TariffDate).where(TariffDate.date == date))
     tariff_date = result.scalar()
 
     return tariff_date
 
 
-def get_tariff_date_lte_date(db: Session, date: date | str) -> TariffDate:
-    tariff_date = db.execute(
-        select(TariffDate)
-        .where(TariffDate.date <= date)
-        .order_by(desc(TariffDate.date))
-    ).scalar()
-
-    if not tariff_date:
-        raise TariffDateNotFound
-    
-    return tariff_date   
-
-
-def get_tariff_date(db: Session, date: date | str) -> Optional[TariffDate]:
-    result = db.execute(select(TariffDate).where(TariffDate.date == date))
+async def get_tariff_date(db: AsyncSession, date: date | str) -> Optional[TariffDate]:
+    result = await db.execute(select(TariffDate).where(TariffDate.date == date))
     tariff_date = result.scalar()
 
     return tariff_date
 
 
-def get_tariff(db: Session, date_id: int, cargo_type: str) -> Optional[Tariff]:
-    tariff = db.execute(
+async def get_tariff(db: AsyncSession, tariff_date: TariffDate, cargo_type: str) -> Optional[Tariff]:
+    result = await db.execute(
                 select(Tariff).where(
-                    Tariff.date_id == date_id,
+                    Tariff.date_id == tariff_date.id,
+                    Tariff.date == tariff_date.date,
                     Tariff.cargo_type == cargo_type
                 )
-            ).scalar()
+            )
+    tariff = result.scalar()
     
     return tariff
 
 
-def create_tariffs(db: Session, tariffs: dict):
-    for date_str, tariffs_list in tariffs.items():
-        tariff_date = get_tariff_date(db, date_str)
-
-        if not tariff_date:
-            tariff_date = TariffDate(date=date_str)
-            db.add(tariff_date)
-            db.flush()
-
-        for tariff in tariffs_list:
-            existing_tariff = get_tariff(db, tariff_date.id, tariff["cargo_type"])
-
-            if existing_tariff:
-                existing_tariff.rate = float(tariff["rate"])
-            else:
-                new_tariff = Tariff(
-                    cargo_type=tariff["cargo_type"],
-                    rate=float(tariff["rate"]),
-                    date_id=tariff_date.id
-                )
-                db.add(new_tariff)
-
-    db.commit()
-
-
-def remove_tariff(db: Session, tariff_date: TariffDate, cargo_type: str):
-    tariff = get_tariff(db, tariff_date.id, cargo_type)
+async def upsert_tariffs(db: AsyncSession, tariffs: dict) -> Dict[date, Dict[str, float]]:
+    """
+    Загружает тарифы пакетными INSERT ... ON CONFLICT DO UPDATE без коммита.
+    Существующие ставки перезаписываются, при повторе пары
+    (дата, cargo_type) побеждает последнее значение.
+    Даты и тарифы вставляются по возрастанию, чтобы параллельные
+    загрузки блокировали строки в одном порядке.
+    Возвращает загруженные ставки по датам.
+    """
+    rates_by_date = {
+        date.fromisoformat(str(date_str)): {
+            tariff["cargo_type"]: float(tariff["rate"]) for tariff in tariffs_list
+        }
+        for date_str, tariffs_list in tariffs.items()
+    }
+    rates_by_date = dict(sorted(rates_by_date.items()))
+
+    if not rates_by_date:
+        return rates_by_date
+
+    date_insert = insert(TariffDate.__table__)
+    result = await db.execute(
+        date_insert
+        .values([{"date": tariff_date} for tariff_date in rates_by_date])
+        .on_conflict_do_update(
+            index_elements=[TariffDate.date],
+            set_={"date": date_insert.excluded.date},
+        )
+        .returning(TariffDate.date, TariffDate.id)
+    )
+    date_ids = dict(result.all())
+
+    rows = [
+        {"date_id": date_ids[tariff_date], "date": tariff_date, "cargo_type": cargo_type, "rate": rate}
+        for tariff_date, rates in rates_by_date.items()
+        for cargo_type, rate in sorted(rates.items())
+    ]
+
+    # executemany разбивается SQLAlchemy на многострочные VALUES (insertmanyvalues)
+    tariff_insert = insert(Tariff.__table__)
+    await db.execute(
+        tariff_insert.on_conflict_do_update(
+            index_elements=[Tariff.date_id, Tariff.cargo_type, Tariff.date],
+            set_={"rate": tariff_insert.excluded.rate},
+        ),
+        rows,
+    )
+
+    return rates_by_date
+
+
+async def apply_tariffs(db: AsyncSession, tariffs: dict) -> int:
+    """
+    Новая версия тарифной книги, upsert тарифов, запись в журнал изменений
+    и пересчет интервалов действия дат в одной транзакции, без коммита.
+    Версия увеличивается первой: блокировка ее строки упорядочивает
+    параллельные загрузки до вставки дат, поэтому отложенная проверка
+    ex_tariff_dates_validity не ждет незафиксированных дат другой загрузки,
+    а пересчет интервалов видит уже зафиксированные.
+    Возвращает новую версию тарифной книги.
+    """
+    version = await bump_tariff_book_version(db)
+    rates_by_date = await upsert_tariffs(db, tariffs)
+
+    if rates_by_date:
+        await record_tariff_changes(db, version, CHANGE_UPSERT, (
+            (tariff_date, cargo_type, rate)
+            for tariff_date, rates in rates_by_date.items()
+            for cargo_type, rate in rates.items()
+        ))
+        await refresh_tariff_validity(db, min(rates_by_date))
+
+    return version
+
+
+async def create_tariffs(db: AsyncSession, tariffs: dict):
+    version = await apply_tariffs(db, tariffs)
+
+    await db.commit()
+    tariff_cache.invalidate()
+    tariff_book_version.observe(version)
+    snapshot_publisher.notify()
+    tariff_change_feed.notify()
+
+
+async def import_tariff_records(
+    db: AsyncSession, records: AsyncIterable[Tuple[int, date, str, float]], errors: TariffCsvErrors
+) -> int:
+    """
+    Загружает записи (номер строки, дата, cargo_type, ставка) через COPY
+    во временную таблицу и сливает их в tariff_dates и tariffs.
+    Если при чтении записей накопились ошибки, транзакция откатывается целиком.
+    Возвращает количество загруженных тарифов.
+    """
+    conn = await db.connection()
+    await conn.execute(CREATE_IMPORT_STAGING)
+
+    raw_connection = await conn.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        IMPORT_STAGING_TABLE,
+        records=records,
+        columns=["line_no", "date", "cargo_type", "rate"],
+    )
+
+    if errors:
+        await db.rollback()
+        return 0
+
+    # версия до вставки дат, как в apply_tariffs
+    version = await bump_tariff_book_version(db)
+    await conn.execute(MERGE_IMPORT_DATES)
+    result = await conn.execute(MERGE_IMPORT_STAGING)
+    rows = result.rowcount
+
+    if not rows:
+        await db.rollback()
+        return 0
+
+    result = await conn.execute(text(f"SELECT min(date) FROM {IMPORT_STAGING_TABLE}"))
+    first_date = result.scalar()
+    await conn.execute(RECORD_IMPORT_CHANGES, {"version": version, "op": CHANGE_UPSERT})
+    await refresh_tariff_validity(db, first_date)
+
+    await db.commit()
+    tariff_cache.invalidate()
+    tariff_book_version.observe(version)
+    snapshot_publisher.notify()
+    tariff_change_feed.notify()
+
+    return rows
+
+
+async def create_tariffs_in_chunks(
+    db: AsyncSession, tariffs: AsyncIterable[Tuple[str, List[dict]]], chunk_size: int
+) -> int:
+    """
+    Загружает тарифы из потока пар (дата, список тарифов),
+    фиксируя транзакцию после каждых chunk_size тарифов.
+    Возвращает количество загруженных тарифов.
+    """
+    chunk = {}
+    chunk_rows = 0
+    total_rows = 0
+
+    try:
+        async for date_str, tariffs_list in tariffs:
+            chunk[date_str] = chunk.get(date_str, []) + tariffs_list
+            chunk_rows += len(tariffs_list)
+            total_rows += len(tariffs_list)
+
+            if chunk_rows >= chunk_size:
+                version = await apply_tariffs(db, chunk)
+                await db.commit()
+                tariff_book_version.observe(version)
+                snapshot_publisher.notify()
+                tariff_change_feed.notify()
+                chunk = {}
+                chunk_rows = 0
+
+        version = await apply_tariffs(db, chunk)
+        await db.commit()
+        tariff_book_version.observe(version)
+        snapshot_publisher.notify()
+        tariff_change_feed.notify()
+    finally:
+        tariff_cache.invalidate()
+
+    return total_rows
+
+
+async def get_tariff_dates_page(
+    db: AsyncSession,
+    size: int,
+    sort_desc: bool = False,
+    after: Optional[date] = None,
+    offset: int = 0,
+) -> List[TariffDate]:
+    """
+    Страница дат с тарифами. При переданном after используется keyset-пагинация
+    по TariffDate.date, тарифы подгружаются одним дополнительным запросом.
+    """
+    query = select(TariffDate).options(selectinload(TariffDate.tariffs))
+
+    if not sort_desc:
+        query = query.order_by(TariffDate.date.asc())
+        if after is not None:
+            query = query.where(TariffDate.date > after)
+    else:
+        query = query.order_by(TariffDate.date.desc())
+        if after is not None:
+            query = query.where(TariffDate.date < after)
+
+    result = await db.execute(query.offset(offset).limit(size))
+
+    return result.scalars().all()
+
+
+def add_tariff_change_event(db: AsyncSession, action: str, details: dict):
+    """
+    Пишет событие изменения тарифа в outbox в текущей транзакции.
+    """
+    db.add(TariffChangeOutbox(
+        topic=TARIFF_CHANGES_TOPIC,
+        payload={
+            "action": action,
+            "details": details,
+            "time": datetime.now(timezone.utc).isoformat()
+        }
+    ))
+
+
+async def remove_tariff(db: AsyncSession, tariff_date: TariffDate, cargo_type: str):
+    version = await bump_tariff_book_version(db)
+    tariff = await get_tariff(db, tariff_date, cargo_type)
 
     if not tariff:
         raise TariffNotFound
 
-    db.execute(delete(Tariff).where(Tariff.id == tariff.id))
-    db.commit()
+    await db.execute(delete(Tariff).where(Tariff.id == tariff.id, Tariff.date == tariff.date))
+    add_tariff_change_event(db, "delete_tariff", {
+        "tariff_date": tariff_date.date.isoformat(),
+        "cargo_type": cargo_type
+    })
+    await record_tariff_changes(db, version, CHANGE_DELETE, [(tariff_date.date, cargo_type, None)])
+    await db.commit()
+    tariff_cache.drop_rate(tariff_date.date, cargo_type, version)
+    tariff_book_version.observe(version)
+    snapshot_publisher.notify()
+    tariff_change_feed.notify()
 
 
-def update_tariff_in_db(db: Session, tariff_date: TariffDate, cargo_type: str, rate: float):
-    tariff = get_tariff(db, tariff_date.id, cargo_type)
+async def update_tariff_in_db(db: AsyncSession, tariff_date: TariffDate, cargo_type: str, rate: float):
+    version = await bump_tariff_book_version(db)
+    tariff = await get_tariff(db, tariff_date, cargo_type)
 
     if not tariff:
         raise TariffNotFound
     
     tariff.rate = rate
-
-    db.commit()
-
-
-def get_tariff_date_or_error(db: Session, date: date | str) -> TariffDate:
-    tariff_date = get_tariff_date(db, date)
+    add_tariff_change_event(db, "update_tariff", {
+        "tariff_date": tariff_date.date.isoformat(),
+        "cargo_type": cargo_type,
+        "rate": str(rate)
+    })
+    await record_tariff_changes(db, version, CHANGE_UPSERT, [(tariff_date.date, cargo_type, rate)])
+
+    await db.commit()
+    tariff_cache.set_rate(tariff_date.date, cargo_type, rate, version)
+    tariff_book_version.observe(version)
+    snapshot_publisher.notify()
+    tariff_change_feed.notify()
+
+
+async def _batch_errors(
+    db: AsyncSession, keys: Iterable[Tuple[date, str]], done: set
+) -> Dict[Tuple[date, str], Optional[Type[Exception]]]:
+    """
+    Итог по каждой паре (дата, cargo_type): None - применено,
+    иначе исключение, которое бы выбросил одиночный запрос.
+    """
+    keys = list(dict.fromkeys(keys))
+    missing_dates = {tariff_date for tariff_date, cargo_type in keys if (tariff_date, cargo_type) not in done}
+    existing_dates = set()
+
+    if missing_dates:
+        result = await db.execute(select(TariffDate.date).where(TariffDate.date.in_(missing_dates)))
+        existing_dates = set(result.scalars())
+
+    return {
+        (tariff_date, cargo_type): (
+            None if (tariff_date, cargo_type) in done
+            else TariffNotFound if tariff_date in existing_dates
+            else TariffDateNotFound
+        )
+        for tariff_date, cargo_type in keys
+    }
+
+
+async def update_tariffs_batch(
+    db: AsyncSession, updates: List[Tuple[date, str, float]]
+) -> Dict[Tuple[date, str], Optional[Type[Exception]]]:
+    """
+    Обновляет ставки одним UPDATE ... FROM (VALUES ...) в одной транзакции
+    с одним событием изменения. При повторе пары побеждает последняя ставка.
+    """
+    rates = {(tariff_date, cargo_type): rate for tariff_date, cargo_type, rate in updates}
+    batch = values(
+        column("date", Date), column("cargo_type", String), column("rate", Float), name="batch"
+    ).data([(tariff_date, cargo_type, rate) for (tariff_date, cargo_type), rate in rates.items()])
+
+    version = await bump_tariff_book_version(db)
+    result = await db.execute(
+        update(Tariff)
+        .where(
+            Tariff.date_id == TariffDate.id,
+            TariffDate.date == batch.c.date,
+            Tariff.date == batch.c.date,
+            Tariff.cargo_type == batch.c.cargo_type,
+        )
+        .values(rate=batch.c.rate)
+        .returning(batch.c.date, Tariff.cargo_type)
+    )
+    done = set(result.tuples())
+
+    if done:
+        add_tariff_change_event(db, "update_tariffs", {"tariffs": [
+            {"tariff_date": tariff_date.isoformat(), "cargo_type": cargo_type, "rate": str(rates[tariff_date, cargo_type])}
+            for tariff_date, cargo_type in sorted(done)
+        ]})
+        await record_tariff_changes(db, version, CHANGE_UPSERT, (
+            (tariff_date, cargo_type, rates[tariff_date, cargo_type]) for tariff_date, cargo_type in sorted(done)
+        ))
+
+    errors = await _batch_errors(db, rates, done)
+
+    if done:
+        await db.commit()
+        for tariff_date, cargo_type in done:
+            tariff_cache.set_rate(tariff_date, cargo_type, rates[tariff_date, cargo_type], version)
+        tariff_book_version.observe(version)
+        snapshot_publisher.notify()
+        tariff_change_feed.notify()
+    else:
+        # строка версии заблокирована с начала пакета
+        await db.rollback()
+
+    return errors
+
+
+async def remove_tariffs_batch(
+    db: AsyncSession, keys: List[Tuple[date, str]]
+) -> Dict[Tuple[date, str], Optional[Type[Exception]]]:
+    """
+    Удаляет тарифы одним DELETE ... USING (VALUES ...) в одной транзакции
+    с одним событием изменения.
+    """
+    batch = values(column("date", Date), column("cargo_type", String), name="batch").data(
+        list(dict.fromkeys(keys))
+    )
+
+    version = await bump_tariff_book_version(db)
+    result = await db.execute(
+        delete(Tariff)
+        .where(
+            Tariff.date_id == TariffDate.id,
+            TariffDate.date == batch.c.date,
+            Tariff.date == batch.c.date,
+            Tariff.cargo_type == batch.c.cargo_type,
+        )
+        .returning(batch.c.date, Tariff.cargo_type)
+    )
+    done = set(result.tuples())
+
+    if done:
+        add_tariff_change_event(db, "delete_tariffs", {"tariffs": [
+            {"tariff_date": tariff_date.isoformat(), "cargo_type": cargo_type}
+            for tariff_date, cargo_type in sorted(done)
+        ]})
+        await record_tariff_changes(db, version, CHANGE_DELETE, (
+            (tariff_date, cargo_type, None) for tariff_date, cargo_type in sorted(done)
+        ))
+
+    errors = await _batch_errors(db, keys, done)
+
+    if done:
+        await db.commit()
+        for tariff_date, cargo_type in done:
+            tariff_cache.drop_rate(tariff_date, cargo_type, version)
+        tariff_book_version.observe(version)
+        snapshot_publisher.notify()
+        tariff_change_feed.notify()
+    else:
+        # строка версии заблокирована с начала пакета
+        await db.rollback()
+
+    return errors
+
+
+async def get_tariff_date_or_error(db: AsyncSession, date: date | str) -> TariffDate:
+    tariff_date = await get_tariff_date(db, date)
     
     if not tariff_date:
         raise TariffDateNotFound
@@ -102,12 +479,89 @@ def get_tariff_date_or_error(db: Session, date: date | str) -> TariffDate:
     return tariff_date
 
 
-def get_tariff_other_or_error(db: Session, date_id: int) -> Tariff:
-    tariff = tariff = db.execute(select(Tariff).where(
-        Tariff.date_id == date_id, 
-        Tariff.cargo_type == "Other")).scalar()
-
-    if not tariff:
-        raise TariffForCalculateNotFound
-    
-    return tariff
+async def get_rates_for_dates(
+    db: AsyncConnection | AsyncSession, keys: Iterable[Tuple[date, str]]
+) -> Dict[date, Optional[Dict[str, float]]]:
+    """
+    Одним запросом находит действующую дату тарифа для каждой запрошенной даты
+    и ставки запрошенных пар (дата, cargo_type) вместе с "Other" этой даты.
+    Пары передаются двумя массивами через unnest, поэтому строк столько же,
+    сколько пар, а не дат на cargo_type.
+    Для дат без действующего тарифа возвращается None.
+    """
+    pairs = set()
+    for requested_date, cargo_type in keys:
+        pairs.add((requested_date, cargo_type))
+        pairs.add((requested_date, "Other"))
+
+    requested = func.unnest(
+        literal([requested_date for requested_date, _ in pairs], ARRAY(Date)),
+        literal([cargo_type for _, cargo_type in pairs], ARRAY(String)),
+    ).table_valued("requested_date", "cargo_type", name="requested").render_derived()
+    effective_date = (
+        select(TariffDate.date)
+        .where(effective_on(requested.c.requested_date))
+        .scalar_subquery()
+    )
+    effective = select(
+        requested.c.requested_date, requested.c.cargo_type, effective_date.label("effective_date")
+    ).subquery()
+
+    result = await db.execute(
+        select(effective.c.requested_date, Tariff.cargo_type, Tariff.rate)
+        .select_from(effective)
+        .outerjoin(TariffDate, TariffDate.date == effective.c.effective_date)
+        .outerjoin(
+            Tariff,
+            (Tariff.date_id == TariffDate.id)
+            & (Tariff.date == TariffDate.date)
+            & (Tariff.cargo_type == effective.c.cargo_type),
+        )
+        .add_columns(effective.c.effective_date)
+    )
+    rows = result.all()
+
+    rates: Dict[date, Optional[Dict[str, float]]] = {}
+
+    for requested_date, cargo_type, rate, found_date in rows:
+        if found_date is None:
+            rates[requested_date] = None
+            continue
+
+        date_rates = rates.setdefault(requested_date, {})
+        if cargo_type is not None:
+            date_rates[cargo_type] = rate
+
+    return rates
+
+
+async def stream_tariff_rows(
+    conn: AsyncConnection,
+    batch_size: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cargo_types: Optional[List[str]] = None,
+) -> AsyncIterator[Sequence[Tuple[date, str, float]]]:
+    """
+    Все тарифы (date, cargo_type, rate) пакетами по batch_size через
+    серверный курсор: в памяти держится не больше одного пакета.
+    """
+    # фильтр по ключу секционирования tariffs: планировщик читает только
+    # секции нужных лет, соединение с tariff_dates не требуется
+    query = (
+        select(Tariff.date, Tariff.cargo_type, Tariff.rate)
+        .order_by(Tariff.date, Tariff.cargo_type)
+        .execution_options(yield_per=batch_size)
+    )
+
+    if date_from is not None:
+        query = query.where(Tariff.date >= date_from)
+    if date_to is not None:
+        query = query.where(Tariff.date <= date_to)
+    if cargo_types:
+        query = query.where(Tariff.cargo_type.in_(cargo_types))
+
+    result = await conn.stream(query)
+
+    async for rows in result.partitions():
+        yield rows
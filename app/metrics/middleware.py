@@ -0,0 +1,55 @@
+from time import perf_counter
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics.registry import (HTTP_REQUEST_SECONDS, HTTP_REQUESTS,
+                                  HTTP_REQUESTS_IN_PROGRESS,
+                                  REQUEST_DB_SECONDS, REQUEST_DB_STATEMENTS)
+from database.instrumentation import start_query_stats
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Снимает по каждому HTTP-запросу время, статус, число
+    и суммарное время SQL-запросов. Маршрут берется шаблоном
+    (/tariffs/{tariff_date}), чтобы не плодить метки.
+    """
+
+    def __init__(self, app: ASGIApp, excluded_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        query_stats = start_query_stats()
+        start = perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            in_progress.dec()
+
+            route = scope.get("route")
+            route_path = route.path if route is not None else UNMATCHED_ROUTE
+
+            HTTP_REQUESTS.labels(method, route_path, status_code).inc()
+            HTTP_REQUEST_SECONDS.labels(method, route_path).observe(elapsed)
+            REQUEST_DB_STATEMENTS.labels(method, route_path).observe(query_stats.statements)
+            REQUEST_DB_SECONDS.labels(method, route_path).observe(query_stats.seconds)
@@ -0,0 +1,58 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Количество обработанных HTTP-запросов",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Количество HTTP-запросов в обработке",
+    ["method"],
+)
+
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements",
+    "Количество SQL-запросов на один HTTP-запрос",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_duration_seconds",
+    "Суммарное время SQL-запросов на один HTTP-запрос",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+KAFKA_SENDS = Counter(
+    "kafka_send_events_total",
+    "Количество событий, отправленных в Kafka",
+    ["result"],
+)
+
+TARIFF_EXCEPTIONS_RAISED = Counter(
+    "tariff_exceptions_total",
+    "Количество ошибок операций с тарифами",
+    ["exception"],
+)
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+CALCULATE_BATCH_REQUESTS = Histogram(
+    "calculate_batch_requests",
+    "Количество запросов /calculate в одном пакете склейки",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+CALCULATE_BATCH_KEYS = Histogram(
+    "calculate_batch_keys",
+    "Количество разных (date, cargo_type) в одном пакете склейки",
+    buckets=BATCH_SIZE_BUCKETS,
+)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.audit.sinks import AuditSink, KafkaAuditSink
+from app.config import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL
+from database.models import TariffChangeOutbox
+from database.session import session_local
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Фоновая доставка событий из таблицы outbox.
+
+    Забирает пакет самых старых событий (FOR UPDATE SKIP LOCKED, чтобы
+    несколько воркеров не отправляли одно и то же), отдает его в sink
+    и удаляет из таблицы только после успешной отправки.
+    Sink свой, не зависит от AUDIT_SINK: строки outbox удаляются
+    после отправки, поэтому sink обязан быть durable.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        sink: Optional[AuditSink] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self.events_sent = 0
+        self.batches_sent = 0
+        self.failures = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.lag_seconds = 0.0
+
+    def check_sink(self):
+        if self.sink is None or not self.sink.durable:
+            raise ValueError(f"Outbox relay needs a durable sink, got {type(self.sink).__name__}")
+
+    async def drain_once(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(TariffChangeOutbox)
+                .order_by(TariffChangeOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+
+            if not events:
+                self.lag_seconds = 0.0
+                return 0
+
+            self.lag_seconds = (datetime.now(timezone.utc) - events[0].created_at).total_seconds()
+
+            await asyncio.to_thread(
+                self.sink.send_batch, [(event.topic, event.payload) for event in events]
+            )
+
+            await db.execute(
+                delete(TariffChangeOutbox)
+                .where(TariffChangeOutbox.id.in_([event.id for event in events]))
+            )
+            await db.commit()
+
+        self.events_sent += len(events)
+        self.batches_sent += 1
+        self.last_batch_size = len(events)
+        self.max_batch_size = max(self.max_batch_size, len(events))
+
+        return len(events)
+
+    async def run(self):
+        while True:
+            try:
+                sent = await self.drain_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to relay tariff change events: {e}")
+                sent = 0
+
+            if sent < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> dict:
+        return {
+            "events_sent": self.events_sent,
+            "batches_sent": self.batches_sent,
+            "failures": self.failures,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": self.events_sent / self.batches_sent if self.batches_sent else 0.0,
+            "lag_seconds": self.lag_seconds,
+        }
+
+
+outbox_relay = OutboxRelay(session_local, KafkaAuditSink())
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from hmac import compare_digest
+from time import perf_counter
+from uuid import uuid4
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import PROFILING_INTERVAL
+from app.profiling.sampler import StackSampler
+from database.instrumentation import start_statement_log
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует отдельный запрос с заголовком X-Profile-Token, равным
+    секрету из настроек. В каталог directory пишутся свернутые стеки
+    (<id>.folded) и журнал SQL-запросов с временем (<id>.json),
+    id профиля возвращается в заголовке X-Profile-Id.
+    Запросы без заголовка проходят без профилирования.
+
+    Сэмплируется поток event loop целиком, поэтому при параллельных
+    запросах в профиль попадают и их стеки.
+    """
+
+    def __init__(self, app: ASGIApp, token: str, directory: str, interval: float = PROFILING_INTERVAL):
+        self.app = app
+        self.token = token.encode()
+        self.directory = directory
+        self.interval = interval
+
+    def _requested(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_TOKEN_HEADER:
+                return compare_digest(value, self.token)
+
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid4().hex[:8]}"
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        statements = start_statement_log()
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        start = perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            sampler.stop()
+
+            summary = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "seconds": elapsed,
+                "samples": sum(sampler.samples.values()),
+                "interval": self.interval,
+                "sql_seconds": sum(seconds for _, seconds in statements),
+                "statements": [{"sql": sql, "seconds": seconds} for sql, seconds in statements],
+            }
+            await asyncio.to_thread(self.write, profile_id, sampler.folded(), summary)
+
+    def write(self, profile_id: str, folded: str, summary: dict):
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(os.path.join(self.directory, f"{profile_id}.folded"), "w") as f:
+            f.write(folded)
+
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
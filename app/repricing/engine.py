@@ -0,0 +1,191 @@
+"""
+What-if переоценка портфеля: премии по историческим отгрузкам
+на кандидатной и текущей тарифных книгах.
+
+Обе книги представлены снимками TariffSnapshot, поэтому поиск действующей
+даты и откат на "Other" работают так же, как в /calculate, но векторно
+над пакетом отгрузок.
+"""
+import math
+import re
+from datetime import date
+from typing import AsyncIterator, Dict, List, Sequence, Tuple
+
+import numpy as np
+from fastapi import UploadFile
+
+from app.snapshot.snapshot import TariffSnapshot
+from app.utils.tariff_csv import iter_csv_batches, is_header
+
+SHIPMENT_COLUMNS = ("date", "cargo_type", "cost")
+# date(1970, 1, 1).toordinal(): datetime64[D] считает дни от 1970-01-01
+EPOCH_ORDINAL = 719163
+# datetime64 принимает и "2020", и "2020-05", и "20200105" как год 20200105
+SHIPMENT_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class ShipmentFileError(ValueError):
+    def __init__(self, line: int, error: str):
+        super().__init__(f"Строка {line}: {error}")
+        self.line = line
+        self.error = error
+
+
+async def read_candidate_book(items: AsyncIterator[Tuple[str, List[dict]]]) -> TariffSnapshot:
+    """
+    Кандидатная книга в формате /tariffs/upload как снимок, из потока
+    пар (дата, тарифы) - см. iter_tariff_file.
+    Выбрасывает ValueError при некорректной или пустой книге.
+    """
+    rows = []
+    async for date_str, tariffs_list in items:
+        tariff_date = date.fromisoformat(str(date_str))
+        for tariff in tariffs_list:
+            rows.append((tariff_date, str(tariff["cargo_type"]), float(tariff["rate"])))
+
+    if not rows:
+        raise ValueError("Пустая книга тарифов")
+
+    rows.sort(key=lambda row: row[0])
+
+    return TariffSnapshot.from_rows(0, rows)
+
+
+def parse_shipments(batch: Sequence[Tuple[int, List[str]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Пакет строк CSV (date, cargo_type, cost) в массивы: ordinal дат,
+    cargo_type, стоимости. Разбор векторный, номер ошибочной строки
+    ищется построчно только при ошибке.
+    """
+    try:
+        if any(len(row) != len(SHIPMENT_COLUMNS) for _, row in batch):
+            raise ValueError
+        date_strs = [row[0].strip() for _, row in batch]
+        if not all(map(SHIPMENT_DATE.fullmatch, date_strs)):
+            raise ValueError
+        # год 0000 datetime64 принимает, а date - нет
+        ordinals = np.array(date_strs, dtype="datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+        if (ordinals < 1).any():
+            raise ValueError
+        costs = np.array([row[2].strip() for _, row in batch], dtype=np.float64)
+        # nan и inf float() принимает, но в JSON ответа они не попадут
+        if not np.isfinite(costs).all():
+            raise ValueError
+    except ValueError:
+        for line_no, row in batch:
+            if len(row) != len(SHIPMENT_COLUMNS):
+                raise ShipmentFileError(line_no, f"ожидалось {len(SHIPMENT_COLUMNS)} колонки, получено {len(row)}")
+            try:
+                if not SHIPMENT_DATE.fullmatch(row[0].strip()):
+                    raise ValueError
+                date.fromisoformat(row[0].strip())
+            except ValueError:
+                raise ShipmentFileError(line_no, f"некорректная дата {row[0]!r}, ожидается YYYY-MM-DD")
+            try:
+                if not math.isfinite(float(row[2])):
+                    raise ValueError
+            except ValueError:
+                raise ShipmentFileError(line_no, f"некорректная стоимость {row[2]!r}")
+        raise
+    cargo_types = np.array([row[1].strip() for _, row in batch])
+
+    return ordinals, cargo_types, costs
+
+
+class RepricingReport:
+    """
+    Накопленные итоги: число отгрузок и премии по кандидатной
+    и текущей книгам в разрезе cargo_type и даты отгрузки.
+    Отгрузка без тарифа в книге в премию этой книги не входит
+    и учитывается в счетчике unpriced.
+    """
+
+    def __init__(self, candidate: TariffSnapshot, current: TariffSnapshot):
+        self.candidate = candidate
+        self.current = current
+        self.shipments = 0
+        self.unpriced = {"candidate": 0, "current": 0}
+        self.by_cargo_type: Dict[str, np.ndarray] = {}
+        self.by_date: Dict[int, np.ndarray] = {}
+
+    def add(self, ordinals: np.ndarray, cargo_types: np.ndarray, costs: np.ndarray):
+        cargo_names, cargo_inverse = np.unique(cargo_types, return_inverse=True)
+        premiums = []
+
+        for book_name, book in (("candidate", self.candidate), ("current", self.current)):
+            rates, _ = book.get_rates(ordinals, cargo_names, cargo_inverse)
+            priced = ~np.isnan(rates)
+            self.unpriced[book_name] += int(len(rates) - priced.sum())
+            premiums.append(np.where(priced, costs * rates, 0.0))
+
+        # столбцы: отгрузки, премия по кандидатной книге, по текущей
+        values = np.column_stack([np.ones(len(costs)), *premiums])
+        self.shipments += len(costs)
+
+        self._accumulate(self.by_cargo_type, cargo_names.tolist(), cargo_inverse, values)
+
+        date_values, date_inverse = np.unique(ordinals, return_inverse=True)
+        self._accumulate(self.by_date, date_values.tolist(), date_inverse, values)
+
+    @staticmethod
+    def _accumulate(totals: dict, keys: list, inverse: np.ndarray, values: np.ndarray):
+        sums = np.stack(
+            [np.bincount(inverse, weights=values[:, column], minlength=len(keys)) for column in range(values.shape[1])],
+            axis=1,
+        )
+        for key, row in zip(keys, sums):
+            if key in totals:
+                totals[key] += row
+            else:
+                totals[key] = row
+
+    @staticmethod
+    def _line(row: np.ndarray) -> dict:
+        return {
+            "shipments": int(row[0]),
+            "candidate": round(float(row[1]), 2),
+            "current": round(float(row[2]), 2),
+            "delta": round(float(row[1] - row[2]), 2),
+        }
+
+    def result(self) -> dict:
+        total = sum(self.by_cargo_type.values(), np.zeros(3))
+
+        return {
+            "shipments": self.shipments,
+            "unpriced": self.unpriced,
+            "total": self._line(total),
+            "by_cargo_type": [
+                {"cargo_type": cargo_type, **self._line(row)}
+                for cargo_type, row in sorted(self.by_cargo_type.items())
+            ],
+            "by_date": [
+                {"date": date.fromordinal(ordinal).isoformat(), **self._line(row)}
+                for ordinal, row in sorted(self.by_date.items())
+            ],
+        }
+
+
+async def iter_shipment_chunks(file: UploadFile, chunk_size: int) -> AsyncIterator[List[Tuple[int, List[str]]]]:
+    """
+    Строки файла отгрузок пакетами примерно по chunk_size, без заголовка.
+    """
+    chunk: List[Tuple[int, List[str]]] = []
+
+    async for batch in iter_csv_batches(file):
+        chunk.extend(
+            (line_no, row) for line_no, row in batch
+            if not is_header(line_no, row, SHIPMENT_COLUMNS)
+        )
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def reprice_chunk(report: RepricingReport, chunk: Sequence[Tuple[int, List[str]]]):
+    report.add(*parse_shipments(chunk))
+
@@ -0,0 +1,106 @@
+import asyncio
+import fcntl
+import logging
+from typing import Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import TARIFF_SNAPSHOT_PATH, TARIFF_SNAPSHOT_POLL_INTERVAL
+from app.crud.tariff_version import VERSION_ROW_ID
+from app.snapshot.snapshot import TariffSnapshot
+from database.models import Tariff, TariffBookVersion, TariffDate
+from database.session import session_local
+
+logger = logging.getLogger(__name__)
+
+
+async def build_snapshot(db: AsyncSession, version: int = 0) -> TariffSnapshot:
+    """
+    Снимок текущей тарифной книги из tariff_dates и tariffs.
+    """
+    result = await db.execute(
+        select(TariffDate.date, Tariff.cargo_type, Tariff.rate)
+        .outerjoin(Tariff, Tariff.date_id == TariffDate.id)
+        .order_by(TariffDate.date)
+    )
+
+    return TariffSnapshot.from_rows(version, result.all())
+
+
+class SnapshotPublisher:
+    """
+    Фоновая публикация снимка тарифной книги.
+
+    Сравнивает версию тарифной книги в БД с версией опубликованного файла
+    и при расхождении собирает новый снимок. Сборкой занимается один воркер:
+    остальные не получают блокировку файла и пропускают цикл.
+    notify() будит публикацию сразу после локального изменения тарифов.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        path: str = TARIFF_SNAPSHOT_PATH,
+        poll_interval: float = TARIFF_SNAPSHOT_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.path = path
+        self.poll_interval = poll_interval
+
+        self.published = 0
+        self.failures = 0
+        self._wakeup = asyncio.Event()
+
+    async def publish_once(self) -> bool:
+        with open(f"{self.path}.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            async with self.session_factory() as db:
+                # версия читается до данных: снимок может оказаться новее
+                # своей версии (тогда просто пересоберется), но не старее
+                result = await db.execute(
+                    select(TariffBookVersion.version).where(TariffBookVersion.id == VERSION_ROW_ID)
+                )
+                version = result.scalar() or 0
+
+                if TariffSnapshot.read_version(self.path) == version:
+                    return False
+
+                snapshot = await build_snapshot(db, version)
+
+            await asyncio.to_thread(snapshot.write, self.path)
+
+        self.published += 1
+
+        return True
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                await self.publish_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to publish tariff snapshot: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "failures": self.failures,
+            "published_version": TariffSnapshot.read_version(self.path),
+        }
+
+
+snapshot_publisher = SnapshotPublisher(session_local)
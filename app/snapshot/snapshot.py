@@ -0,0 +1,248 @@
+"""
+Компактный бинарный снимок тарифной книги.
+
+Формат файла (little-endian):
+    заголовок  - магия, версия тарифной книги, число дат, число cargo_type,
+                 длина списка имен cargo_type
+    dates      - int32[число дат], ordinal дат по возрастанию (с выравниванием до 8 байт)
+    rates      - float64[число дат x число cargo_type], NaN - тарифа нет
+    cargo      - JSON-список имен cargo_type, индекс имени - его ID (столбец rates)
+
+Файл публикуется атомарной заменой (os.replace) и открывается через mmap:
+массивы numpy смотрят прямо в общие страницы памяти, поэтому N воркеров
+держат одну копию книги.
+"""
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from datetime import date
+from math import isnan, nan
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import TARIFF_SNAPSHOT_CHECK_INTERVAL, TARIFF_SNAPSHOT_PATH
+from app.utils.exceptions import TariffDateNotFound, TariffForCalculateNotFound
+
+MAGIC = b"TRFSNAP1"
+HEADER = struct.Struct("<8sQIII4x")
+OTHER_CARGO_TYPE = "Other"
+
+
+def _align(offset: int, size: int = 8) -> int:
+    return (offset + size - 1) // size * size
+
+
+class TariffSnapshot:
+    """
+    Тарифная книга в виде массивов: отсортированные ordinal дат,
+    интернированные cargo_type и матрица ставок float64.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        dates: np.ndarray,
+        cargo_types: List[str],
+        rates: np.ndarray,
+        buffer: Optional[mmap.mmap] = None,
+    ):
+        self.version = version
+        self.dates = dates
+        self.cargo_types = cargo_types
+        self.rates = rates
+        self.cargo_ids: Dict[str, int] = {name: i for i, name in enumerate(cargo_types)}
+        self._other_id = self.cargo_ids.get(OTHER_CARGO_TYPE)
+        # плоские memoryview над теми же байтами: поэлементный доступ
+        # из Python к ним дешевле, чем к скалярам numpy
+        self._dates_view = memoryview(dates)
+        self._rates_view = memoryview(rates.reshape(-1))
+        self._width = len(cargo_types)
+        # mmap живет, пока живет снимок: на него ссылаются массивы
+        self._buffer = buffer
+
+    @classmethod
+    def from_rows(cls, version: int, rows: Iterable[Tuple[date, Optional[str], Optional[float]]]) -> "TariffSnapshot":
+        """
+        Строки (дата, cargo_type, ставка) отсортированы по дате,
+        у дат без тарифов cargo_type и ставка - None.
+        """
+        dates: List[int] = []
+        cargo_ids: Dict[str, int] = {}
+        cells: List[Tuple[int, int, float]] = []
+
+        for tariff_date, cargo_type, rate in rows:
+            ordinal = tariff_date.toordinal()
+            if not dates or dates[-1] != ordinal:
+                dates.append(ordinal)
+            if cargo_type is not None:
+                cargo_id = cargo_ids.setdefault(cargo_type, len(cargo_ids))
+                cells.append((len(dates) - 1, cargo_id, rate))
+
+        rates = np.full((len(dates), len(cargo_ids)), np.nan, dtype=np.float64)
+        if cells:
+            rows_idx, cols_idx, values = zip(*cells)
+            rates[list(rows_idx), list(cols_idx)] = values
+
+        return cls(version, np.array(dates, dtype=np.int32), list(cargo_ids), rates)
+
+    @classmethod
+    def open(cls, path: str) -> "TariffSnapshot":
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, dates_count, cargo_count, names_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"Not a tariff snapshot: {path}")
+
+        dates_offset = HEADER.size
+        rates_offset = _align(dates_offset + dates_count * 4)
+        names_offset = rates_offset + dates_count * cargo_count * 8
+
+        dates = np.frombuffer(buffer, dtype="<i4", count=dates_count, offset=dates_offset)
+        rates = np.frombuffer(
+            buffer, dtype="<f8", count=dates_count * cargo_count, offset=rates_offset
+        ).reshape(dates_count, cargo_count)
+        cargo_types = json.loads(buffer[names_offset:names_offset + names_size])
+
+        return cls(version, dates, cargo_types, rates, buffer)
+
+    @staticmethod
+    def read_version(path: str) -> Optional[int]:
+        """
+        Версия опубликованного снимка по заголовку, без отображения файла.
+        """
+        try:
+            with open(path, "rb") as file:
+                magic, version, *_ = HEADER.unpack(file.read(HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+
+        return version if magic == MAGIC else None
+
+    def write(self, path: str):
+        """
+        Пишет снимок во временный файл рядом и атомарно подменяет path:
+        читатели видят либо старый, либо новый файл целиком.
+        """
+        names = json.dumps(self.cargo_types, ensure_ascii=False).encode("utf-8")
+        dates_count, cargo_count = self.rates.shape[0], len(self.cargo_types)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        with open(tmp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, self.version, dates_count, cargo_count, len(names)))
+            file.write(self.dates.astype("<i4").tobytes())
+            file.write(b"\0" * (_align(HEADER.size + dates_count * 4) - HEADER.size - dates_count * 4))
+            file.write(np.ascontiguousarray(self.rates, dtype="<f8").tobytes())
+            file.write(names)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp_path, path)
+
+    @property
+    def nbytes(self) -> int:
+        return self.dates.nbytes + self.rates.nbytes
+
+    def get_rate(self, on_date: date, cargo_type: str) -> float:
+        index = bisect_right(self._dates_view, on_date.toordinal()) - 1
+
+        if index < 0:
+            raise TariffDateNotFound
+
+        rate = nan
+        cargo_id = self.cargo_ids.get(cargo_type)
+
+        if cargo_id is not None:
+            rate = self._rates_view[index * self._width + cargo_id]
+
+        if isnan(rate) and self._other_id is not None:
+            rate = self._rates_view[index * self._width + self._other_id]
+
+        if isnan(rate):
+            raise TariffForCalculateNotFound
+
+        return rate
+
+    def get_rates(
+        self, ordinals: np.ndarray, cargo_names: Sequence[str], cargo_inverse: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Векторный вариант get_rate для массива позиций: ordinal дат и
+        cargo_type, закодированные как cargo_names[cargo_inverse] (np.unique).
+        Возвращает ставки (NaN, если тарифа нет и с откатом на "Other")
+        и маску позиций, для которых нашлась действующая дата.
+        """
+        date_index = np.searchsorted(self.dates, ordinals, side="right") - 1
+        date_found = date_index >= 0
+
+        name_ids = np.array([self.cargo_ids.get(name, -1) for name in cargo_names], dtype=np.intp)
+        cargo_ids = name_ids[cargo_inverse] if len(name_ids) else np.full(len(ordinals), -1, dtype=np.intp)
+
+        rates = np.full(len(ordinals), np.nan)
+        direct = date_found & (cargo_ids >= 0)
+        rates[direct] = self.rates[date_index[direct], cargo_ids[direct]]
+
+        if self._other_id is not None:
+            fallback = date_found & np.isnan(rates)
+            rates[fallback] = self.rates[date_index[fallback], self._other_id]
+
+        return rates, date_found
+
+
+class SnapshotReader:
+    """
+    Текущий снимок для воркера. Не чаще раза в check_interval
+    проверяет, не подменен ли файл, и при подмене открывает новый.
+    Старый снимок освобождается, когда на него не остается ссылок.
+    """
+
+    def __init__(self, path: str = TARIFF_SNAPSHOT_PATH, check_interval: float = TARIFF_SNAPSHOT_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.swaps = 0
+        self._snapshot: Optional[TariffSnapshot] = None
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._checked_at: Optional[float] = None
+
+    def current(self) -> Optional[TariffSnapshot]:
+        now = monotonic()
+
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._refresh()
+
+        return self._snapshot
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._snapshot, self._file_id = None, None
+            return
+
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+
+        if file_id != self._file_id:
+            self._snapshot = TariffSnapshot.open(self.path)
+            self._file_id = file_id
+            self.swaps += 1
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+
+        return {
+            "path": self.path,
+            "loaded": snapshot is not None,
+            "version": snapshot.version if snapshot else None,
+            "dates": len(snapshot.dates) if snapshot else 0,
+            "cargo_types": len(snapshot.cargo_types) if snapshot else 0,
+            "bytes": snapshot.nbytes if snapshot else 0,
+            "swaps": self.swaps,
+        }
+
+
+snapshot_reader = SnapshotReader()
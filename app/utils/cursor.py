@@ -0,0 +1,25 @@
+import base64
+import binascii
+import json
+from datetime import date
+from typing import Tuple
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(last_date: date, sort_desc: bool) -> str:
+    raw = json.dumps({"d": last_date.isoformat(), "desc": sort_desc}).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, bool]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+
+        return date.fromisoformat(data["d"]), bool(data["desc"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor
@@ -0,0 +1,28 @@
+from hashlib import blake2b
+from typing import Hashable, Optional
+
+
+def make_etag(version: int, key: Hashable) -> str:
+    """
+    Сильный ETag представления: версия тарифной книги
+    плюс короткий хэш параметров запроса.
+    """
+    digest = blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверка If-None-Match (RFC 9110): список тегов или "*",
+    сравнение слабое - префикс W/ игнорируется.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    tags = (tag.strip() for tag in if_none_match.split(","))
+
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
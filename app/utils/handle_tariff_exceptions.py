@@ -3,31 +3,28 @@ from typing import Callable
 
 from fastapi import HTTPException
 
+from app.metrics.registry import TARIFF_EXCEPTIONS_RAISED
 from app.utils.exceptions import (TariffDateNotFound,
                                   TariffForCalculateNotFound, TariffNotFound)
 
+TARIFF_EXCEPTIONS = {
+    TariffDateNotFound: (404, "На указанную дату тарифов не существует."),
+    TariffNotFound: (404, "Тариф с указанным cargo_type на данную дату не найден."),
+    TariffForCalculateNotFound: (500, "Тариф для расчета не найден. Обратитесь в тех. поддержку."),
+}
+
 
 def handle_tariff_exceptions(func: Callable):
     @wraps(func)
-    def wrapper(*args, **kwargs):
+    async def wrapper(*args, **kwargs):
         try:
-            return func(*args, **kwargs)
-        except TariffDateNotFound:
-            raise HTTPException(
-                status_code=404,
-                detail="На указанную дату тарифов не существует."
-            )
-        except TariffNotFound:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Тариф с указанным cargo_type на данную дату не найден."
-            )
-        except TariffForCalculateNotFound:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Тариф для расчета не найден. Обратитесь в тех. поддержку."
-            )
+            return await func(*args, **kwargs)
+        except tuple(TARIFF_EXCEPTIONS) as e:
+            TARIFF_EXCEPTIONS_RAISED.labels(type(e).__name__).inc()
+            status_code, detail = TARIFF_EXCEPTIONS[type(e)]
+            raise HTTPException(status_code=status_code, detail=detail)
         except Exception:
+            TARIFF_EXCEPTIONS_RAISED.labels("unexpected").inc()
             raise HTTPException(
                 status_code=500,
                 detail="Произошла ошибка при выполнении операции с тарифом"
@@ -0,0 +1,41 @@
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from app.utils.exceptions import TariffDateNotFound, TariffForCalculateNotFound
+
+
+def calculate_prices(
+    dates: Sequence[date],
+    cargo_types: Sequence[str],
+    costs: Sequence[float],
+    rates: Dict[date, Optional[Dict[str, float]]],
+) -> Tuple[np.ndarray, List[Optional[Type[Exception]]]]:
+    """
+    Подбирает ставку для каждой позиции (с откатом на "Other") и считает
+    стоимость страхования одной векторной операцией cost * rate.
+    Для позиций с ошибкой цена равна NaN, а в списке ошибок - класс исключения.
+    """
+    size = len(costs)
+    rate_values = np.full(size, np.nan)
+    errors: List[Optional[Type[Exception]]] = [None] * size
+
+    for i, (requested_date, cargo_type) in enumerate(zip(dates, cargo_types)):
+        date_rates = rates.get(requested_date)
+
+        if date_rates is None:
+            errors[i] = TariffDateNotFound
+            continue
+
+        rate = date_rates.get(cargo_type, date_rates.get("Other"))
+
+        if rate is None:
+            errors[i] = TariffForCalculateNotFound
+            continue
+
+        rate_values[i] = rate
+
+    prices = np.asarray(costs, dtype=np.float64) * rate_values
+
+    return prices, errors
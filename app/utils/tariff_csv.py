@@ -0,0 +1,110 @@
+import codecs
+import csv
+from datetime import date
+from math import isfinite
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import UploadFile
+
+CSV_COLUMNS = ("date", "cargo_type", "rate")
+READ_CHUNK_SIZE = 1 << 16
+
+
+class TariffCsvErrors:
+    """
+    Ошибки строк CSV: общее количество и первые max_items с номерами строк.
+    """
+
+    def __init__(self, max_items: int = 100):
+        self.max_items = max_items
+        self.count = 0
+        self.items: List[dict] = []
+
+    def add(self, line: int, error: str):
+        self.count += 1
+        if len(self.items) < self.max_items:
+            self.items.append({"line": line, "error": error})
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+
+def parse_tariff_row(row: List[str]) -> Tuple[date, str, float]:
+    """
+    Проверяет строку (date, cargo_type, rate). Выбрасывает ValueError с описанием.
+    """
+    if len(row) != len(CSV_COLUMNS):
+        raise ValueError(f"Ожидалось {len(CSV_COLUMNS)} колонки, получено {len(row)}")
+
+    date_str, cargo_type, rate_str = (value.strip() for value in row)
+
+    try:
+        tariff_date = date.fromisoformat(date_str)
+    except ValueError:
+        raise ValueError(f"Некорректная дата: {date_str!r}")
+
+    if not cargo_type:
+        raise ValueError("Пустой cargo_type")
+
+    try:
+        rate = float(rate_str)
+    except ValueError:
+        raise ValueError(f"Некорректная ставка: {rate_str!r}")
+
+    if not isfinite(rate) or rate < 0:
+        raise ValueError(f"Ставка должна быть неотрицательным числом: {rate_str!r}")
+
+    return tariff_date, cargo_type, rate
+
+
+async def iter_csv_batches(file: UploadFile) -> AsyncIterator[List[Tuple[int, List[str]]]]:
+    """
+    Потоково читает CSV и отдает пакеты непустых строк (номер строки, значения)
+    по одному на прочитанный блок файла. Одна запись - одна строка файла.
+    Выбрасывает UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    line_no = 0
+
+    while True:
+        chunk = await file.read(READ_CHUNK_SIZE)
+        text = tail + decoder.decode(chunk, final=not chunk)
+        lines = text.splitlines(keepends=True)
+        # "\r" в конце блока может быть первой половиной "\r\n" - ждем следующий блок
+        tail = lines.pop() if chunk and lines and not lines[-1].endswith("\n") else ""
+
+        batch = []
+        for row in csv.reader(lines):
+            line_no += 1
+
+            if row and (len(row) > 1 or row[0].strip()):
+                batch.append((line_no, row))
+
+        if batch:
+            yield batch
+
+        if not chunk:
+            break
+
+
+def is_header(line_no: int, row: List[str], columns: Tuple[str, ...]) -> bool:
+    return line_no == 1 and [value.strip().lower() for value in row] == list(columns)
+
+
+async def iter_tariff_csv(file: UploadFile, errors: TariffCsvErrors) -> AsyncIterator[Tuple[int, date, str, float]]:
+    """
+    Потоково читает CSV (date, cargo_type, rate; заголовок необязателен)
+    и отдает корректные строки (номер строки, дата, cargo_type, ставка).
+    Ошибки строк складываются в errors, чтение продолжается.
+    Выбрасывает UnicodeDecodeError.
+    """
+    async for batch in iter_csv_batches(file):
+        for line_no, row in batch:
+            if is_header(line_no, row, CSV_COLUMNS):
+                continue
+
+            try:
+                yield (line_no, *parse_tariff_row(row))
+            except ValueError as e:
+                errors.add(line_no, str(e))
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Callable, Iterable, Optional, Sequence
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+CSV_HEADER = ("date", "cargo_type", "rate")
+
+
+def encode_ndjson(rows: Iterable[Sequence]) -> bytes:
+    return "".join(
+        json.dumps({"date": tariff_date.isoformat(), "cargo_type": cargo_type, "rate": rate}, ensure_ascii=False) + "\n"
+        for tariff_date, cargo_type, rate in rows
+    ).encode("utf-8")
+
+
+def encode_changes_ndjson(rows: Iterable[Sequence]) -> bytes:
+    return "".join(
+        json.dumps(
+            {"version": version, "op": op, "date": tariff_date.isoformat(), "cargo_type": cargo_type, "rate": rate},
+            ensure_ascii=False,
+        ) + "\n"
+        for version, op, tariff_date, cargo_type, rate in rows
+    ).encode("utf-8")
+
+
+def encode_csv(rows: Iterable[Sequence]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(
+        (tariff_date.isoformat(), cargo_type, repr(rate)) for tariff_date, cargo_type, rate in rows
+    )
+
+    return buffer.getvalue().encode("utf-8")
+
+
+async def encode_export(
+    batches: AsyncIterator[Sequence[Sequence]], export_format: str, compress: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Кодирует пакеты строк (date, cargo_type, rate) в NDJSON или CSV
+    и при compress сжимает поток в gzip по мере генерации.
+    """
+    encode = encode_ndjson if export_format == "ndjson" else encode_csv
+    header = (",".join(CSV_HEADER) + "\n").encode("utf-8") if export_format == "csv" else b""
+
+    async for chunk in encode_stream(batches, encode, compress, header):
+        yield chunk
+
+
+async def encode_stream(
+    batches: AsyncIterator[Sequence[Sequence]],
+    encode: Callable[[Iterable[Sequence]], bytes],
+    compress: bool = False,
+    header: bytes = b"",
+) -> AsyncIterator[bytes]:
+    """
+    Кодирует пакеты строк функцией encode и при compress сжимает поток в gzip.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def output(chunk: bytes) -> bytes:
+        return compressor.compress(chunk) if compressor else chunk
+
+    if header:
+        yield output(header)
+
+    async for rows in batches:
+        chunk = output(encode(rows))
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Есть ли gzip с ненулевым q в Accept-Encoding.
+    """
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*") and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            return True
+
+    return False
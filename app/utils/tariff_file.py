@@ -0,0 +1,39 @@
+import codecs
+from typing import AsyncIterator, List, Tuple
+
+import ijson
+from fastapi import UploadFile
+
+
+class _Utf8CheckingReader:
+    """
+    Обертка над файлом, проверяющая кодировку прочитанных байтов.
+    """
+
+    def __init__(self, file: UploadFile):
+        self._file = file
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    async def read(self, size: int = -1) -> bytes:
+        chunk = await self._file.read(size)
+        self._decoder.decode(chunk, final=not chunk)
+
+        return chunk
+
+
+async def validate_tariff_file(file: UploadFile):
+    """
+    Проверяет, что файл является корректным JSON в UTF-8, не загружая его в память.
+    Выбрасывает UnicodeDecodeError или ijson.JSONError.
+    """
+    async for _ in ijson.parse(_Utf8CheckingReader(file)):
+        pass
+
+    await file.seek(0)
+
+
+def iter_tariff_file(file: UploadFile) -> AsyncIterator[Tuple[str, List[dict]]]:
+    """
+    Последовательно отдает пары (дата, список тарифов) из JSON файла.
+    """
+    return ijson.kvitems(file, "", use_float=True)
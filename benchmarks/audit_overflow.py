@@ -0,0 +1,64 @@
+"""
+Поведение очереди аудита при медленном sink: задержка enqueue и доля
+отброшенных событий для каждой политики переполнения.
+
+    python -m benchmarks.audit_overflow --events 100000 --queue-size 1000 --sink-delay-ms 5
+"""
+import argparse
+import json
+import statistics
+from time import perf_counter, sleep
+
+from app.audit.log import DROP_NEW, DROP_OLDEST, AuditLog
+from app.audit.sinks import AuditSink
+
+
+class SlowAuditSink(AuditSink):
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def send_batch(self, events):
+        sleep(self.delay)
+
+
+def run(policy: str, events: int, queue_size: int, batch_size: int, sink_delay: float) -> dict:
+    log = AuditLog(max_size=queue_size, overflow_policy=policy, batch_size=batch_size, flush_interval=0.01)
+    log.start(SlowAuditSink(sink_delay))
+
+    latencies = []
+    for i in range(events):
+        started = perf_counter()
+        log.log("benchmark", {"i": i})
+        latencies.append(perf_counter() - started)
+
+    log.stop(timeout=60)
+    stats = log.stats()
+    quantiles = statistics.quantiles(latencies, n=100)
+
+    return {
+        "policy": policy,
+        "events": events,
+        "dropped": stats["dropped"],
+        "dropped_ratio": round(stats["dropped"] / events, 4),
+        "sent": stats["sent"],
+        "high_watermark": stats["high_watermark"],
+        "enqueue_p50_us": round(quantiles[49] * 1e6, 2),
+        "enqueue_p99_us": round(quantiles[98] * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sink-delay-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    for policy in (DROP_NEW, DROP_OLDEST):
+        result = run(policy, args.events, args.queue_size, args.batch_size, args.sink_delay_ms / 1000)
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Нагрузочный тест /insurance/calculate с большим числом одновременных клиентов.
+
+Запуск против поднятого приложения:
+
+    python -m benchmarks.calculate_concurrency --url http://127.0.0.1:8000 --concurrency 300
+"""
+import argparse
+import asyncio
+import json
+from time import perf_counter
+
+import httpx
+
+from benchmarks.stats import summarize
+
+
+async def run_client(client: httpx.AsyncClient, payload: dict, count: int, latencies: list, errors: list):
+    for _ in range(count):
+        started = perf_counter()
+        try:
+            response = await client.post("/insurance/calculate", json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(perf_counter() - started)
+
+
+async def run(url: str, concurrency: int, requests_per_client: int, payload: dict) -> dict:
+    latencies = []
+    errors = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        await client.post("/insurance/calculate", json=payload)
+
+        started = perf_counter()
+        await asyncio.gather(*(
+            run_client(client, payload, requests_per_client, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        elapsed = perf_counter() - started
+
+    result = summarize(latencies)
+    result.update(
+        concurrency=concurrency,
+        errors=len(errors),
+        seconds=round(elapsed, 3),
+        rps=round(len(latencies) / elapsed, 1),
+    )
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=300)
+    parser.add_argument("--requests-per-client", type=int, default=10)
+    parser.add_argument("--date", default="2024-01-02")
+    parser.add_argument("--cargo-type", default="Glass")
+    parser.add_argument("--cost", type=float, default=200)
+    args = parser.parse_args()
+
+    payload = {"date": args.date, "cargo_type": args.cargo_type, "cost": args.cost}
+    result = asyncio.run(run(args.url, args.concurrency, args.requests_per_client, payload))
+
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Детерминированный генератор тарифной книги в формате /tariffs/upload.
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict, List
+
+BASE_CARGO_TYPES = [
+    "Glass", "Wood", "Metal", "Electronics", "Food", "Chemicals", "Textile",
+    "Furniture", "Paper", "Plastic", "Machinery", "Pharma", "Auto", "Fuel",
+]
+
+
+def cargo_type_names(count: int) -> List[str]:
+    """
+    "Other" плюс count - 1 типов груза; при нехватке базовых имен добавляются номера.
+    """
+    names = ["Other"]
+    i = 0
+    while len(names) < count:
+        base = BASE_CARGO_TYPES[i % len(BASE_CARGO_TYPES)]
+        names.append(base if i < len(BASE_CARGO_TYPES) else f"{base}_{i // len(BASE_CARGO_TYPES)}")
+        i += 1
+
+    return names
+
+
+def generate_tariff_book(
+    dates: int,
+    cargo_types: int,
+    seed: int = 42,
+    start: date = date(2020, 1, 1),
+    step_days: int = 1,
+) -> Dict[str, List[dict]]:
+    """
+    Книга из dates дат по cargo_types тарифов. Ставка каждого типа груза
+    случайно блуждает от даты к дате, как при регулярной переоценке.
+    """
+    rng = random.Random(seed)
+    names = cargo_type_names(cargo_types)
+    rates = {name: rng.uniform(0.005, 0.05) for name in names}
+
+    book = {}
+    for i in range(dates):
+        for name in names:
+            rates[name] = min(max(rates[name] * rng.uniform(0.97, 1.03), 0.001), 0.2)
+
+        book[(start + timedelta(days=i * step_days)).isoformat()] = [
+            {"cargo_type": name, "rate": round(rates[name], 6)} for name in names
+        ]
+
+    return book
+
+
+def generate_quotes(book: Dict[str, List[dict]], count: int, seed: int = 42) -> List[dict]:
+    """
+    Запросы на расчет по датам внутри книги; часть типов груза неизвестна
+    и уходит в откат на "Other".
+    """
+    rng = random.Random(seed)
+    dates = [date.fromisoformat(d) for d in book]
+    first, last = min(dates), max(dates)
+    names = [tariff["cargo_type"] for tariff in next(iter(book.values()))]
+
+    quotes = []
+    for _ in range(count):
+        quote_date = first + timedelta(days=rng.randint(0, (last - first).days + 30))
+        cargo_type = rng.choice(names) if rng.random() < 0.9 else "Unknown"
+        quotes.append({
+            "date": quote_date.isoformat(),
+            "cargo_type": cargo_type,
+            "cost": round(rng.uniform(1000, 1000000), 2),
+        })
+
+    return quotes
@@ -0,0 +1,130 @@
+"""
+Память под тарифную книгу в одном воркере: ORM-объекты TariffDate/Tariff,
+словари TariffTimelineCache и снимок app.snapshot (массивы numpy в mmap).
+Плюс время одного поиска ставки в кэше и в снимке. База не нужна.
+
+    python -m benchmarks.snapshot_memory --dates 3650 --cargo-types 50
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+from datetime import date
+from time import monotonic, perf_counter
+
+from app.crud.tariff_cache import TariffTimelineCache
+from app.snapshot.snapshot import TariffSnapshot
+from benchmarks.generator import generate_quotes, generate_tariff_book
+from database.models import Tariff, TariffDate
+
+
+def book_rows(book):
+    return [
+        (date.fromisoformat(tariff_date), tariff["cargo_type"], tariff["rate"])
+        for tariff_date, tariffs in book.items()
+        for tariff in tariffs
+    ]
+
+
+def traced(build):
+    """
+    Прирост памяти Python-кучи после build(); результат держится до замера.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, size
+
+
+def build_orm(book):
+    return [
+        TariffDate(
+            date=date.fromisoformat(tariff_date),
+            tariffs=[Tariff(cargo_type=tariff["cargo_type"], rate=tariff["rate"]) for tariff in tariffs],
+        )
+        for tariff_date, tariffs in book.items()
+    ]
+
+
+def build_cache(rows):
+    cache = TariffTimelineCache(ttl=0)
+    for tariff_date, cargo_type, rate in rows:
+        if not cache._dates or cache._dates[-1] != tariff_date:
+            cache._dates.append(tariff_date)
+            cache._rates.append({})
+        cache._rates[-1][cargo_type] = rate
+    cache._loaded_at = monotonic()
+
+    return cache
+
+
+def snapshot_lookup_us(snapshot, quotes):
+    started = perf_counter()
+    for quote in quotes:
+        snapshot.get_rate(quote["date"], quote["cargo_type"])
+
+    return round((perf_counter() - started) / len(quotes) * 1e6, 2)
+
+
+async def cache_lookup_us(cache, quotes):
+    started = perf_counter()
+    for quote in quotes:
+        await cache.get_rate(None, quote["date"], quote["cargo_type"])
+
+    return round((perf_counter() - started) / len(quotes) * 1e6, 2)
+
+
+def run(dates, cargo_types, quotes_count):
+    book = generate_tariff_book(dates, cargo_types)
+    rows = book_rows(book)
+    quotes = [
+        {**quote, "date": date.fromisoformat(quote["date"])}
+        for quote in generate_quotes(book, quotes_count)
+    ]
+
+    _, orm_bytes = traced(lambda: build_orm(book))
+    cache, cache_bytes = traced(lambda: build_cache(rows))
+    _, snapshot_bytes = traced(lambda: TariffSnapshot.from_rows(1, rows))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "tariff_book.snapshot")
+        TariffSnapshot.from_rows(1, rows).write(path)
+        file_bytes = os.path.getsize(path)
+        mapped, mapped_heap_bytes = traced(lambda: TariffSnapshot.open(path))
+
+        results = {
+            "dates": dates,
+            "cargo_types": cargo_types,
+            "tariffs": len(rows),
+            "orm_objects_bytes": orm_bytes,
+            "cache_dicts_bytes": cache_bytes,
+            "snapshot_in_process_bytes": snapshot_bytes,
+            "snapshot_file_bytes": file_bytes,
+            # массивы смотрят в общие страницы файла, в куче воркера - только имена cargo_type
+            "snapshot_mmap_heap_bytes": mapped_heap_bytes,
+            "cache_lookup_us": asyncio.run(cache_lookup_us(cache, quotes)),
+            "snapshot_lookup_us": snapshot_lookup_us(mapped, quotes),
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dates", type=int, default=3650)
+    parser.add_argument("--cargo-types", type=int, default=50)
+    parser.add_argument("--quotes", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.dates, args.cargo_types, args.quotes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
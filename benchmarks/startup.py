@@ -0,0 +1,100 @@
+"""
+Время старта приложения: импорт main и время до первого обработанного
+запроса /insurance/calculate после запуска uvicorn, без прогрева и с прогревом
+пула и кэша (STARTUP_WARMUP_CONNECTIONS, STARTUP_PRELOAD_TARIFFS).
+Подключение к базе берется из переменных окружения DB_*.
+
+    DB_HOST=127.0.0.1 python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from time import perf_counter, sleep
+
+import httpx
+
+from benchmarks.stats import summarize
+
+IMPORT_SNIPPET = "from time import perf_counter; t = perf_counter(); import main; print(perf_counter() - t)"
+
+SCENARIOS = {
+    "cold": {"STARTUP_WARMUP_CONNECTIONS": "0", "STARTUP_PRELOAD_TARIFFS": "false"},
+    "warm": {"STARTUP_WARMUP_CONNECTIONS": "5", "STARTUP_PRELOAD_TARIFFS": "true"},
+}
+
+
+def measure_import(runs: int) -> dict:
+    seconds = [
+        float(subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], stderr=subprocess.DEVNULL))
+        for _ in range(runs)
+    ]
+
+    return summarize(seconds)
+
+
+def measure_start(port: int, env: dict, payload: dict, followup: int) -> dict:
+    """
+    Время от запуска процесса до первого ответа, задержка первого ответа
+    и задержки следующих followup запросов.
+    """
+    started = perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                request_started = perf_counter()
+                try:
+                    client.post("/insurance/calculate", json=payload)
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        raise RuntimeError("Приложение завершилось при старте")
+                    sleep(0.01)
+
+            first_request = perf_counter() - request_started
+            ready = perf_counter() - started
+
+            latencies = []
+            for _ in range(followup):
+                request_started = perf_counter()
+                client.post("/insurance/calculate", json=payload)
+                latencies.append(perf_counter() - request_started)
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {"ready": ready, "first_request": first_request, "latencies": latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--followup", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    payload = {"date": "2024-01-02", "cargo_type": "Glass", "cost": 200}
+    result = {"import": measure_import(args.runs)}
+
+    for name in args.scenarios:
+        runs = [measure_start(args.port, SCENARIOS[name], payload, args.followup) for _ in range(args.runs)]
+        result[name] = {
+            "ready": summarize([run["ready"] for run in runs]),
+            "first_request": summarize([run["first_request"] for run in runs]),
+            "followup": summarize([latency for run in runs for latency in run["latencies"]]),
+        }
+
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
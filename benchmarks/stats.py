@@ -0,0 +1,23 @@
+import statistics
+from typing import List
+
+
+def summarize(latencies: List[float]) -> dict:
+    """
+    Сводка по задержкам в миллисекундах.
+    """
+    if len(latencies) < 2:
+        value = round(latencies[0] * 1000, 3) if latencies else None
+        return {"count": len(latencies), "p50_ms": value, "p95_ms": value, "p99_ms": value}
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "min_ms": round(min(latencies) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
@@ -14,3 +14,15 @@ DB_TEST_PORT=env.str("DB_TEST_PORT", default="5432")
 DB_TEST_NAME=env.str("DB_TEST_NAME", default="postgres_test")
 DB_TEST_USER=env.str("DB_TEST_USER", default="postgres")
 DB_TEST_PASS=env.str("DB_TEST_PASS", default="postgres")
+
+DB_POOL_SIZE=env.int("DB_POOL_SIZE", default=5)
+DB_MAX_OVERFLOW=env.int("DB_MAX_OVERFLOW", default=10)
+DB_POOL_PRE_PING=env.bool("DB_POOL_PRE_PING", default=False)
+DB_ECHO=env.bool("DB_ECHO", default=False)
+DB_METRICS_ENABLED=env.bool("DB_METRICS_ENABLED", default=True)
+
+DB_REPLICA_URLS=env.list("DB_REPLICA_URLS", default=[])
+DB_REPLICA_POOL_SIZE=env.int("DB_REPLICA_POOL_SIZE", default=5)
+DB_REPLICA_MAX_OVERFLOW=env.int("DB_REPLICA_MAX_OVERFLOW", default=10)
+DB_REPLICA_POOL_PRE_PING=env.bool("DB_REPLICA_POOL_PRE_PING", default=True)
+DB_REPLICA_ECHO=env.bool("DB_REPLICA_ECHO", default=False)
@@ -0,0 +1,103 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+from typing import List, Optional, Tuple
+from weakref import WeakSet
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+DB_STATEMENTS = Counter(
+    "db_statements_total",
+    "Количество выполненных SQL-запросов",
+    ["engine"],
+)
+DB_STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds",
+    "Время выполнения одного SQL-запроса",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+@dataclass
+class QueryStats:
+    """
+    Счетчики SQL в рамках одного запроса к API.
+    """
+    statements: int = 0
+    seconds: float = 0.0
+
+
+_instrumented_engines = WeakSet()
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+_statement_log: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("statement_log", default=None)
+
+
+def start_query_stats() -> QueryStats:
+    """
+    Заводит счетчики для текущего контекста (запроса).
+    Контекст asyncio наследуется гринлетами SQLAlchemy,
+    поэтому события движка пишут в тот же объект.
+    """
+    stats = QueryStats()
+    _query_stats.set(stats)
+
+    return stats
+
+
+def start_statement_log() -> List[Tuple[str, float]]:
+    """
+    Заводит журнал (SQL, секунды) для текущего контекста.
+    Используется профилированием отдельного запроса.
+    """
+    statements: List[Tuple[str, float]] = []
+    _statement_log.set(statements)
+
+    return statements
+
+
+def instrument_engine(engine: AsyncEngine, name: str):
+    """
+    Вешает before/after_cursor_execute на движок:
+    общий счетчик и гистограмма плюс счетчики текущего запроса.
+    handle_error снимает время старта упавшего запроса, иначе
+    after_cursor_execute следующего взял бы чужое.
+    """
+    sync_engine = engine.sync_engine
+
+    if sync_engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(sync_engine)
+
+    statements = DB_STATEMENTS.labels(name)
+    statement_seconds = DB_STATEMENT_SECONDS.labels(name)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["query_start"].pop()
+
+        statements.inc()
+        statement_seconds.observe(elapsed)
+
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.seconds += elapsed
+
+        statement_log = _statement_log.get()
+        if statement_log is not None:
+            statement_log.append((statement, elapsed))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and exception_context.execution_context is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Date, Float, ForeignKey, Integer, String
+from sqlalchemy import (DDL, JSON, BigInteger, Column, Date, DateTime, Float,
+                        ForeignKey, Index, Integer, Sequence, String, column,
+                        event, func, text)
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -6,19 +9,96 @@ from .base import Base
 
 class TariffDate(Base):
     __tablename__ = "tariff_dates"
+    __table_args__ = (
+        Index("ix_tariff_dates_date_id", "date", postgresql_include=["id"]),
+        # интервалы действия не пересекаются; GiST-индекс ограничения
+        # отвечает на "какая дата действует на день X" одной пробой
+        ExcludeConstraint(
+            (func.daterange(column("date"), column("valid_to")), "&&"),
+            name="ex_tariff_dates_validity",
+            using="gist",
+            deferrable=True,
+            initially="DEFERRED",
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, unique=True, nullable=False)
+    # следующая дата тарифов (не включительно), NULL - действует бессрочно
+    valid_to = Column(Date, nullable=True)
 
     tariffs = relationship("Tariff", back_populates="tariff_date", cascade="all, delete-orphan")
 
 
+# общая последовательность id всех секций tariffs: identity-столбцы
+# у секционированных таблиц появились только в Postgres 17; скобки
+# в умолчании нужны SQLite
+tariffs_id_seq = Sequence("tariffs_id_seq", metadata=Base.metadata)
+
+
 class Tariff(Base):
+    """
+    В Postgres секционирована по годам даты тарифа (tariffs_y2024, ...),
+    строки без своей секции попадают в tariffs_default.
+    Секции создает и архивирует app.crud.tariff_partitions.
+    date дублирует tariff_dates.date: это ключ секционирования,
+    и уникальный индекс обязан его содержать.
+    """
     __tablename__ = "tariffs"
+    __table_args__ = (
+        Index(
+            "ix_tariffs_date_id_cargo_type", "date_id", "cargo_type", "date",
+            unique=True, postgresql_include=["rate"],
+        ),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, server_default=text("(nextval('tariffs_id_seq'))"), index=True)
     cargo_type = Column(String, nullable=False)
     rate = Column(Float, nullable=False)
     date_id = Column(Integer, ForeignKey("tariff_dates.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, primary_key=True)
 
     tariff_date = relationship("TariffDate", back_populates="tariffs")
+
+
+event.listen(
+    Tariff.__table__,
+    "after_create",
+    DDL("CREATE TABLE tariffs_default PARTITION OF tariffs DEFAULT").execute_if(dialect="postgresql"),
+)
+
+
+class TariffChangeOutbox(Base):
+    __tablename__ = "tariff_change_outbox"
+
+    id = Column(Integer, primary_key=True)
+    topic = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class TariffBookVersion(Base):
+    """
+    Единственная строка (id=1) с версией тарифной книги.
+    Увеличивается в транзакции каждого изменения тарифов.
+    """
+    __tablename__ = "tariff_book_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)
+
+
+class TariffChange(Base):
+    """
+    Журнал изменений тарифов для /tariffs/changes.
+    version - версия тарифной книги, в которой изменение зафиксировано.
+    """
+    __tablename__ = "tariff_changes"
+
+    id = Column(BigInteger, primary_key=True)
+    version = Column(BigInteger, nullable=False, index=True)
+    op = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+    cargo_type = Column(String, nullable=False)
+    rate = Column(Float, nullable=True)
@@ -1,24 +1,149 @@
-from typing import Generator
+from contextlib import AsyncExitStack
+from itertools import cycle
+from typing import AsyncGenerator, Callable, List, Optional
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncEngine,
+                                    AsyncSession, async_sessionmaker,
+                                    create_async_engine)
 
-from .config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from .config import (DB_ECHO, DB_HOST, DB_MAX_OVERFLOW, DB_METRICS_ENABLED,
+                     DB_NAME, DB_PASS, DB_POOL_PRE_PING, DB_POOL_SIZE,
+                     DB_PORT, DB_REPLICA_ECHO, DB_REPLICA_MAX_OVERFLOW,
+                     DB_REPLICA_POOL_PRE_PING, DB_REPLICA_POOL_SIZE,
+                     DB_REPLICA_URLS, DB_USER)
+from .instrumentation import instrument_engine
 
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(
+
+def build_engine(
+    url: str,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_pre_ping: bool = False,
+    echo: bool = False,
+) -> AsyncEngine:
+    options = {"pool_pre_ping": pool_pre_ping, "echo": echo}
+
+    # у SQLite (aiosqlite) нет QueuePool с размером
+    if not url.startswith("sqlite"):
+        options.update(pool_size=pool_size, max_overflow=max_overflow)
+
+    return create_async_engine(url, **options)
+
+
+async def warm_up_engine(engine: AsyncEngine, connections: int) -> int:
+    """
+    Открывает до connections соединений одновременно (не больше размера пула)
+    и возвращает их в пул, чтобы первые запросы не ждали подключения.
+    """
+    pool_size = getattr(engine.pool, "size", None)
+    if pool_size is not None:
+        connections = min(connections, pool_size())
+
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+    return max(connections, 0)
+
+
+class SessionRouter:
+    """
+    Разводит сессии по движкам: запись - в primary,
+    чтение - по кругу в реплики (или в primary, если реплик нет).
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: Optional[List[AsyncEngine]] = None):
+        self.primary = primary
+        self.replicas = replicas or []
+
+        self.write_session = async_sessionmaker(bind=primary, expire_on_commit=False)
+        self._read_sessions = {
+            replica: async_sessionmaker(bind=replica, expire_on_commit=False)
+            for replica in self.replicas
+        }
+        self._read_engines = cycle(self.replicas or [primary])
+
+    def read_engine(self) -> AsyncEngine:
+        return next(self._read_engines)
+
+    def read_session(self) -> AsyncSession:
+        read_engine = self.read_engine()
+
+        return self._read_sessions.get(read_engine, self.write_session)()
+
+    def read_connection(self) -> AsyncConnection:
+        return self.read_engine().connect()
+
+    def engines(self) -> List[AsyncEngine]:
+        return [self.primary, *self.replicas]
+
+    async def warm_up(self, connections: int) -> int:
+        return sum([await warm_up_engine(engine, connections) for engine in self.engines()])
+
+    async def dispose(self):
+        for engine in self.engines():
+            await engine.dispose()
+
+
+engine = build_engine(
     DATABASE_URL,
-    future=True,
-    echo=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    echo=DB_ECHO,
 )
 
-session_local = sessionmaker(bind=engine, expire_on_commit=False)
+replica_engines = [
+    build_engine(
+        url,
+        pool_size=DB_REPLICA_POOL_SIZE,
+        max_overflow=DB_REPLICA_MAX_OVERFLOW,
+        pool_pre_ping=DB_REPLICA_POOL_PRE_PING,
+        echo=DB_REPLICA_ECHO,
+    )
+    for url in DB_REPLICA_URLS
+]
+
+if DB_METRICS_ENABLED:
+    instrument_engine(engine, "primary")
+
+    for index, replica_engine in enumerate(replica_engines):
+        instrument_engine(replica_engine, f"replica_{index}")
+
+session_router = SessionRouter(engine, replica_engines)
+
+session_local = session_router.write_session
+
+
+async def get_write_db() -> AsyncGenerator[AsyncSession, None]:
+    async with session_router.write_session() as session:
+        yield session
 
 
-def get_db() -> Generator[Session, None, None]:
-    session: Session = session_local()
-    try: 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with session_router.read_session() as session:
         yield session
-    finally:
-        session.close()
+
+
+async def get_read_conn() -> AsyncGenerator[AsyncConnection, None]:
+    """
+    Соединение с репликой без Session - для быстрых запросов расчета.
+    """
+    async with session_router.read_connection() as conn:
+        yield conn
+
+
+def get_read_conn_factory() -> Callable[[], AsyncConnection]:
+    """
+    Фабрика соединений с репликой для потоковых ответов: тело
+    StreamingResponse отдается уже после закрытия yield-зависимостей,
+    поэтому соединение открывает сам генератор ответа.
+    """
+    return session_router.read_connection
+
+
+get_db = get_write_db
@@ -1,13 +1,101 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from typing import Optional
+
 import uvicorn
 from fastapi import FastAPI
 
 from app.api.insurance_routers import insurance_routers
+from app.api.metrics_routers import metrics_routers
 from app.api.tariff_routers import tariff_routers
+from app.audit.log import audit_log
+from app.audit.sinks import create_audit_sink
+from app.config import TARIFF_CACHE_ENABLED, AppSettings
+from app.crud.tariff_cache import tariff_cache
+from app.crud.tariff_partitions import tariff_partition_maintainer
+from app.crud.tariff_version import tariff_book_version
+from app.metrics.middleware import MetricsMiddleware
+from app.outbox.relay import outbox_relay
+from app.profiling.middleware import ProfilingMiddleware
+from app.snapshot.publisher import snapshot_publisher
+from database.session import session_router
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(settings: AppSettings):
+    """
+    Открывает соединения пулов и загружает версию книги и кэш тарифов
+    до приема запросов. Ошибка прогрева не мешает старту.
+    """
+    try:
+        await session_router.warm_up(settings.warmup_connections)
+
+        if settings.preload_tariffs:
+            async with session_router.read_connection() as conn:
+                await tariff_book_version.get(conn)
+                if TARIFF_CACHE_ENABLED:
+                    await tariff_cache.load(conn)
+    except Exception as e:
+        logger.error(f"Failed to warm up: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings: AppSettings = app.state.settings
+
+    # без durable sink события изменений удалялись бы из outbox безвозвратно
+    if settings.outbox_relay_enabled:
+        outbox_relay.check_sink()
+
+    sink = create_audit_sink(settings.audit_sink)
+    audit_log.start(sink)
+
+    await warm_up(settings)
+
+    tasks = []
+    if settings.outbox_relay_enabled:
+        tasks.append(asyncio.create_task(outbox_relay.run()))
+    if settings.snapshot_publisher_enabled:
+        tasks.append(asyncio.create_task(snapshot_publisher.run()))
+    if settings.partition_maintenance_enabled:
+        tasks.append(asyncio.create_task(tariff_partition_maintainer.run()))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    audit_log.stop()
+    sink.close()
+    outbox_relay.sink.close()
+    await session_router.dispose()
+
+
+def create_app(settings: Optional[AppSettings] = None) -> FastAPI:
+    settings = settings or AppSettings()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+
+    app.include_router(tariff_routers, prefix="/tariffs", tags=["tariffs"])
+    app.include_router(insurance_routers, prefix="/insurance", tags=["insurance"])
+
+    if settings.metrics_enabled:
+        app.add_middleware(MetricsMiddleware)
+        app.include_router(metrics_routers)
+
+    # без секрета профилирование не включается
+    if settings.profiling_enabled and settings.profiling_token:
+        app.add_middleware(ProfilingMiddleware, token=settings.profiling_token, directory=settings.profiling_dir)
+
+    return app
 
-app = FastAPI()
 
-app.include_router(tariff_routers, prefix="/tariffs", tags=["tariffs"])
-app.include_router(insurance_routers, prefix="/insurance", tags=["insurance"])
+app = create_app()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,27 @@
+"""add covering indexes
+
+Revision ID: 3b9c1f2d7a41
+Revises: aef70b7d3144
+Create Date: 2026-10-17 10:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c1f2d7a41'
+down_revision: Union[str, None] = 'aef70b7d3144'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tariff_dates_date_id', 'tariff_dates', ['date'], unique=False, postgresql_include=['id'])
+    op.create_index('ix_tariffs_date_id_cargo_type', 'tariffs', ['date_id', 'cargo_type'], unique=False, postgresql_include=['rate'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tariffs_date_id_cargo_type', table_name='tariffs')
+    op.drop_index('ix_tariff_dates_date_id', table_name='tariff_dates')
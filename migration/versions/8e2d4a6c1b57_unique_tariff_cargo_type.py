@@ -0,0 +1,37 @@
+"""unique tariff cargo type
+
+Revision ID: 8e2d4a6c1b57
+Revises: 3b9c1f2d7a41
+Create Date: 2026-10-17 11:03:09.264711
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2d4a6c1b57'
+down_revision: Union[str, None] = '3b9c1f2d7a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # оставляем последнюю загруженную ставку для каждой пары (date_id, cargo_type)
+    op.execute(
+        """
+        DELETE FROM tariffs t
+        USING tariffs newer
+        WHERE newer.date_id = t.date_id
+          AND newer.cargo_type = t.cargo_type
+          AND newer.id > t.id
+        """
+    )
+    op.drop_index('ix_tariffs_date_id_cargo_type', table_name='tariffs')
+    op.create_index('ix_tariffs_date_id_cargo_type', 'tariffs', ['date_id', 'cargo_type'], unique=True, postgresql_include=['rate'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tariffs_date_id_cargo_type', table_name='tariffs')
+    op.create_index('ix_tariffs_date_id_cargo_type', 'tariffs', ['date_id', 'cargo_type'], unique=False, postgresql_include=['rate'])
@@ -0,0 +1,48 @@
+"""add tariff date validity
+
+Revision ID: 9a4c6e2b1f35
+Revises: 5d7f3b8e9a12
+Create Date: 2026-10-17 16:40:52.113907
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4c6e2b1f35'
+down_revision: Union[str, None] = '5d7f3b8e9a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tariff_dates', sa.Column('valid_to', sa.Date(), nullable=True))
+
+    # valid_to - следующая дата тарифов, у последней даты NULL
+    op.execute(
+        """
+        UPDATE tariff_dates AS t
+        SET valid_to = n.next_date
+        FROM (
+            SELECT id, lead(date) OVER (ORDER BY date) AS next_date
+            FROM tariff_dates
+        ) AS n
+        WHERE t.id = n.id
+        """
+    )
+
+    op.create_exclude_constraint(
+        'ex_tariff_dates_validity',
+        'tariff_dates',
+        (sa.func.daterange(sa.column('date'), sa.column('valid_to')), '&&'),
+        using='gist',
+        deferrable=True,
+        initially='DEFERRED',
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('ex_tariff_dates_validity', 'tariff_dates')
+    op.drop_column('tariff_dates', 'valid_to')
@@ -0,0 +1,104 @@
+"""partition tariffs by year
+
+Revision ID: f3a9d1c6b8e2
+Revises: e7b2c5d8f4a3
+Create Date: 2026-10-17 19:26:48.130662
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d1c6b8e2'
+down_revision: Union[str, None] = 'e7b2c5d8f4a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# секции на годы с данными и на текущий и следующий год,
+# дальше секции создает app.crud.tariff_partitions
+YEARS_AHEAD = 1
+
+
+def rename_tariffs(new_name: str):
+    """
+    Старая таблица уступает имена таблице, индексам и последовательности.
+    """
+    op.rename_table('tariffs', new_name)
+    op.execute(f"ALTER INDEX ix_tariffs_date_id_cargo_type RENAME TO ix_{new_name}_date_id_cargo_type")
+    op.execute(f"ALTER INDEX ix_tariffs_id RENAME TO ix_{new_name}_id")
+    op.execute(f"ALTER TABLE {new_name} RENAME CONSTRAINT tariffs_pkey TO {new_name}_pkey")
+    op.execute(f"ALTER TABLE {new_name} RENAME CONSTRAINT tariffs_date_id_fkey TO {new_name}_date_id_fkey")
+    op.execute(f"ALTER TABLE {new_name} ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE tariffs_id_seq OWNED BY NONE")
+
+
+def create_tariffs_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('tariffs_id_seq'::regclass)"), nullable=False),
+        sa.Column('cargo_type', sa.String(), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.Column('date_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['date_id'], ['tariff_dates.id'], ondelete='CASCADE'),
+    ]
+
+
+def upgrade() -> None:
+    rename_tariffs('tariffs_heap')
+
+    op.create_table('tariffs',
+    *create_tariffs_columns(),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'date'),
+    postgresql_partition_by='RANGE (date)'
+    )
+    op.execute("ALTER SEQUENCE tariffs_id_seq OWNED BY tariffs.id")
+    op.create_index(op.f('ix_tariffs_id'), 'tariffs', ['id'], unique=False)
+    op.create_index('ix_tariffs_date_id_cargo_type', 'tariffs', ['date_id', 'cargo_type', 'date'], unique=True, postgresql_include=['rate'])
+
+    years = {
+        row[0] for row in op.get_bind().execute(
+            sa.text("SELECT DISTINCT extract(year FROM date)::int FROM tariff_dates")
+        )
+    }
+    years |= set(range(date.today().year, date.today().year + YEARS_AHEAD + 1))
+
+    for year in sorted(years):
+        op.execute(
+            f"CREATE TABLE tariffs_y{year} PARTITION OF tariffs "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+    op.execute("CREATE TABLE tariffs_default PARTITION OF tariffs DEFAULT")
+
+    op.execute(
+        """
+        INSERT INTO tariffs (id, cargo_type, rate, date_id, date)
+        SELECT t.id, t.cargo_type, t.rate, t.date_id, d.date
+        FROM tariffs_heap t
+        JOIN tariff_dates d ON d.id = t.date_id
+        """
+    )
+    op.drop_table('tariffs_heap')
+
+
+def downgrade() -> None:
+    rename_tariffs('tariffs_partitioned')
+
+    op.create_table('tariffs',
+    *create_tariffs_columns(),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("ALTER SEQUENCE tariffs_id_seq OWNED BY tariffs.id")
+    op.create_index(op.f('ix_tariffs_id'), 'tariffs', ['id'], unique=False)
+    op.create_index('ix_tariffs_date_id_cargo_type', 'tariffs', ['date_id', 'cargo_type'], unique=True, postgresql_include=['rate'])
+
+    op.execute(
+        """
+        INSERT INTO tariffs (id, cargo_type, rate, date_id)
+        SELECT id, cargo_type, rate, date_id FROM tariffs_partitioned
+        """
+    )
+    # секции удаляются вместе с родительской таблицей
+    op.drop_table('tariffs_partitioned')